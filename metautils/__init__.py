@@ -12,13 +12,49 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from metautils.compat import compose
-from metautils.template import T, templated
-from metautils.singleton import Singleton
+import sys
+
+# The submodules are imported the first time one of their names is used so
+# that importing `metautils` is cheap.
+_lazy = {
+    'T': 'metautils.template',
+    'Singleton': 'metautils.singleton',
+    'templated': 'metautils.template',
+    'compose': 'metautils.compat',
+    'prefork': 'metautils.template',
+    'prewarm': 'metautils.template',
+}
+
+
+def __getattr__(name):
+    try:
+        module = _lazy[name]
+    except KeyError:
+        raise AttributeError(
+            'module {0!r} has no attribute {1!r}'.format(__name__, name),
+        )
+
+    __import__(module)
+    value = getattr(sys.modules[module], name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
+
+
+if sys.version_info < (3, 7):
+    # Module `__getattr__` requires Python 3.7.
+    from metautils.compat import compose  # noqa
+    from metautils.template import T, prefork, prewarm, templated  # noqa
+    from metautils.singleton import Singleton  # noqa
 
 __all__ = [
     'T',
     'Singleton',
     'templated',
     'compose',
+    'prefork',
+    'prewarm',
 ]
@@ -0,0 +1,143 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Apply a function to many items, optionally with a `concurrent.futures`
+executor.
+
+Compositions made with `compose` have these as the methods `map`, `imap`
+and `chunked`.
+"""
+from collections import deque
+from itertools import chain, islice
+
+try:
+    from itertools import imap as _lazy_map
+except ImportError:
+    _lazy_map = map
+
+
+# The chunk size used when the number of items is not known.
+_default_chunksize = 256
+
+
+def _chunks(iterable, chunksize):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _call_chunk(f, chunk):
+    return [f(n) for n in chunk]
+
+
+def _workers(executor):
+    # The standard executors store their size here.
+    return getattr(executor, '_max_workers', None) or 4
+
+
+def _executor_chunks(f, iterable, executor, chunksize):
+    """
+    Yield the results of each chunk in order, keeping a bounded number of
+    chunks in flight.
+    """
+    workers = _workers(executor)
+    if chunksize is None:
+        try:
+            chunksize = max(1, -(-len(iterable) // (workers * 4)))
+        except TypeError:
+            chunksize = _default_chunksize
+
+    window = workers * 2
+    pending = deque()
+    try:
+        for chunk in _chunks(iterable, chunksize):
+            pending.append(executor.submit(_call_chunk, f, chunk))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def chunked(f, iterable, chunksize=None, executor=None):
+    """
+    Lazily apply `f` to each item of `iterable` in chunks.
+
+    Parameters
+    ----------
+    f : callable
+        The function to apply.
+    iterable : iterable
+        The items.
+    chunksize : int, optional
+        The number of items per chunk. With an executor, the default
+        splits the items into about four chunks per worker if the number
+        of items is known. Larger chunks spread the cost of sending work
+        to processes over more items.
+    executor : concurrent.futures.Executor, optional
+        The executor to run the chunks on. Only a few chunks per worker
+        are submitted ahead of the chunks being consumed, so memory use
+        stays bounded. With a process pool, `f` must be picklable;
+        compositions pickle as their stages.
+
+    Returns
+    -------
+    chunks : iterator[list]
+        The results of each chunk, in the order of the items.
+    """
+    if executor is not None:
+        return _executor_chunks(f, iterable, executor, chunksize)
+
+    return (
+        _call_chunk(f, chunk)
+        for chunk in _chunks(iterable, chunksize or _default_chunksize)
+    )
+
+
+def imap(f, iterable, chunksize=None, executor=None):
+    """
+    Lazily apply `f` to each item of `iterable`, in order.
+
+    The arguments are the same as `chunked`. Without an executor, this is
+    the builtin lazy `map`.
+    """
+    if executor is None:
+        return _lazy_map(f, iterable)
+
+    return chain.from_iterable(
+        _executor_chunks(f, iterable, executor, chunksize),
+    )
+
+
+def map(f, iterable, chunksize=None, executor=None):
+    """
+    Apply `f` to each item of `iterable` and return a list of the results,
+    in order.
+
+    The arguments are the same as `chunked`.
+    """
+    return list(imap(f, iterable, chunksize=chunksize, executor=executor))
+
+
+__all__ = [
+    'chunked',
+    'imap',
+    'map',
+]
@@ -0,0 +1,224 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Benchmarks for the metautils hot paths.
+
+Benchmarks are registered with the `benchmark` decorator. A benchmark is a
+setup function that returns a zero argument callable; only the callable is
+timed. Run the suite with `python -m metautils.bench`.
+"""
+from collections import OrderedDict
+import json
+import platform
+import subprocess
+import sys
+from timeit import Timer
+
+_benchmarks = OrderedDict()
+
+# The name that selects `import_time` in `run`.
+_import_time_name = 'import_time'
+
+
+def benchmark(name):
+    """
+    Register a benchmark under `name`.
+
+    The decorated function is called once to set up the benchmark and must
+    return the zero argument callable to time.
+    """
+    def dec(setup):
+        if name in _benchmarks:
+            raise ValueError('duplicate benchmark: {0!r}'.format(name))
+        _benchmarks[name] = setup
+        return setup
+
+    return dec
+
+
+def benchmarks():
+    """
+    Returns the names of all of the registered benchmarks in the order they
+    were registered.
+    """
+    _load()
+    return list(_benchmarks)
+
+
+def _load():
+    # Importing the module registers the benchmarks.
+    import metautils.bench.suite  # noqa
+
+
+def _autorange(timer):
+    """
+    Find a number of loops that takes at least 0.2 seconds.
+    """
+    number = 1
+    while True:
+        for n in (1, 2, 5):
+            loops = number * n
+            if timer.timeit(loops) >= 0.2:
+                return loops
+        number *= 10
+
+
+def time_benchmark(name, number=None, repeat=5):
+    """
+    Time a single benchmark.
+
+    Parameters
+    ----------
+    name : str
+        The name of the benchmark to run.
+    number : int, optional
+        The number of calls per timing run. By default this is picked so that
+        each run takes at least 0.2 seconds.
+    repeat : int, optional
+        The number of timing runs.
+
+    Returns
+    -------
+    result : dict
+        The name of the benchmark, the loop parameters, and the best and
+        mean time per call in nanoseconds.
+    """
+    _load()
+    f = _benchmarks[name]()
+    timer = Timer(f)
+    if number is None:
+        number = _autorange(timer)
+
+    times = [t / number * 1e9 for t in timer.repeat(repeat, number)]
+    return OrderedDict([
+        ('name', name),
+        ('number', number),
+        ('repeat', repeat),
+        ('best_ns', min(times)),
+        ('mean_ns', sum(times) / len(times)),
+    ])
+
+
+def import_time(module='metautils', repeat=5):
+    """
+    Measure the time it takes to import a module in a fresh interpreter
+    with `python -X importtime`.
+
+    Parameters
+    ----------
+    module : str, optional
+        The module to import.
+    repeat : int, optional
+        The number of interpreters to run.
+
+    Returns
+    -------
+    import_time : int
+        The best cumulative import time of `module` in microseconds.
+    """
+    times = []
+    for _ in range(repeat):
+        stderr = subprocess.check_output(
+            [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        )
+        for line in stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            _, cumulative, name = line.split('|')
+            if name.strip() == module and name.startswith(' ' + module):
+                times.append(int(cumulative))
+                break
+        else:
+            raise ValueError('{0} was not imported'.format(module))
+
+    return min(times)
+
+
+def _version():
+    try:
+        from importlib.metadata import version
+    except ImportError:
+        return None
+
+    try:
+        return version('metautils')
+    except Exception:
+        return None
+
+
+def run(names=None, number=None, repeat=5):
+    """
+    Run the benchmarks.
+
+    Parameters
+    ----------
+    names : iterable[str], optional
+        The benchmarks to run, which may include 'import_time' to measure
+        `import_time`. By default all of the benchmarks are run and the
+        import time is measured.
+    number : int, optional
+        The number of calls per timing run.
+    repeat : int, optional
+        The number of timing runs per benchmark.
+
+    Returns
+    -------
+    report : dict
+        A json serializable report of the environment and the results. The
+        import time is `None` if it was not selected.
+    """
+    if names is None:
+        names = [_import_time_name] + benchmarks()
+
+    names = list(names)
+    if _import_time_name in names:
+        # This starts `repeat` interpreters, so only do it when asked.
+        names.remove(_import_time_name)
+        import_time_us = import_time(repeat=repeat)
+    else:
+        import_time_us = None
+
+    return OrderedDict([
+        ('metautils', _version()),
+        ('python', platform.python_version()),
+        ('implementation', platform.python_implementation()),
+        ('platform', platform.platform()),
+        ('import_time_us', import_time_us),
+        ('results', [
+            time_benchmark(name, number=number, repeat=repeat)
+            for name in names
+        ]),
+    ])
+
+
+def dump(report, file=None):
+    """
+    Write a report from `run` as json to `file`, defaulting to stdout.
+    """
+    if file is None:
+        file = sys.stdout
+    json.dump(report, file, indent=2)
+    file.write('\n')
+
+
+__all__ = [
+    'benchmark',
+    'benchmarks',
+    'dump',
+    'import_time',
+    'run',
+    'time_benchmark',
+]
@@ -0,0 +1,80 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from argparse import ArgumentParser
+from fnmatch import fnmatch
+import sys
+
+from metautils.bench import _import_time_name, benchmarks, dump, run
+
+
+def main(argv=None):
+    parser = ArgumentParser(
+        prog='python -m metautils.bench',
+        description='Run the metautils benchmarks and write a json report.',
+    )
+    parser.add_argument(
+        'patterns',
+        nargs='*',
+        help=(
+            'Glob patterns selecting the benchmarks to run, including'
+            ' {0!r}.'.format(_import_time_name)
+        ),
+    )
+    parser.add_argument(
+        '-o', '--output',
+        help='The file to write the report to. Defaults to stdout.',
+    )
+    parser.add_argument(
+        '-n', '--number',
+        type=int,
+        help='The number of calls per timing run.',
+    )
+    parser.add_argument(
+        '-r', '--repeat',
+        type=int,
+        default=5,
+        help='The number of timing runs per benchmark.',
+    )
+    parser.add_argument(
+        '-l', '--list',
+        action='store_true',
+        help='List the benchmarks and exit.',
+    )
+    args = parser.parse_args(argv)
+
+    names = [_import_time_name] + benchmarks()
+    if args.patterns:
+        names = [
+            name for name in names
+            if any(fnmatch(name, pattern) for pattern in args.patterns)
+        ]
+
+    if args.list:
+        for name in names:
+            print(name)
+        return 0
+
+    report = run(names, number=args.number, repeat=args.repeat)
+    if args.output is None:
+        dump(report)
+    else:
+        with open(args.output, 'w') as f:
+            dump(report, f)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from metautils import T, compose, templated
+from metautils.bench import benchmark
+from metautils.compat import NonLocal
+from metautils.singleton import Singleton
+from metautils.template import TemplateChain
+
+
+class _Base(object):
+    def method(self, a):
+        return a
+
+
+class _Super(_Base):
+    def method(self, a):
+        return super(_Super, self).method(a)
+
+
+class _Method(T):
+    @templated
+    def method(self, a, T_):
+        return T_.method(self, a)
+
+
+class _Meta(T):
+    @templated
+    def __new__(mcls, name, bases, dict_, T_):
+        return T_.__new__(mcls, name, bases, dict_)
+
+
+def _inc(n):
+    return n + 1
+
+
+@benchmark('template_call_miss')
+def template_call_miss():
+    class Uncached(T(cachesize=-1)):
+        @templated
+        def __new__(mcls, name, bases, dict_, T_):
+            return T_.__new__(mcls, name, bases, dict_)
+
+    return Uncached
+
+
+@benchmark('template_call_miss_large')
+def template_call_miss_large():
+    # A template with a large body and only a few templated hooks.
+    dict_ = {'c%d' % n: n for n in range(50)}
+    for n in range(40):
+        dict_['m%d' % n] = lambda self: None
+
+    def __new__(mcls, name, bases, dict_, T_):
+        return T_.__new__(mcls, name, bases, dict_)
+
+    dict_['__new__'] = templated(__new__)
+    return type(T)('Large', (T(cachesize=-1),), dict_)
+
+
+@benchmark('template_call_hit')
+def template_call_hit():
+    # Hold a reference to the class so that it stays in the cache.
+    held = _Meta(type)
+
+    def f():
+        return _Meta(type), held
+
+    return f
+
+
+@benchmark('template_chain_hit')
+def template_chain_hit():
+    chain = compose(*(_Meta,) * 5)
+    held = chain(type)
+
+    def f():
+        return chain(type), held
+
+    return f
+
+
+@benchmark('templated_method')
+def templated_method():
+    inst = _Method(_Base)()
+    return lambda: inst.method(1)
+
+
+@benchmark('chain_metaclass_new_10')
+def chain_metaclass_new_10():
+    meta = TemplateChain(*(_Meta,) * 10)(type)
+    return lambda: meta('C', (object,), {})
+
+
+@benchmark('flat_chain_metaclass_new_10')
+def flat_chain_metaclass_new_10():
+    meta = TemplateChain(*(_Meta,) * 10, flatten=True)(type)
+    return lambda: meta('C', (object,), {})
+
+
+@benchmark('super_method')
+def super_method():
+    inst = _Super()
+    return lambda: inst.method(1)
+
+
+@benchmark('templated_metaclass_new')
+def templated_metaclass_new():
+    meta = _Meta(type)
+    return lambda: meta('C', (object,), {})
+
+
+def _compose_call(n):
+    f = compose(*(_inc,) * n)
+    return lambda: f(0)
+
+
+for _n in (1, 5, 50):
+    benchmark('compose_call_{0}'.format(_n))(
+        lambda n=_n: _compose_call(n),
+    )
+del _n
+
+
+@benchmark('singleton_create')
+def singleton_create():
+    meta = Singleton()
+    return lambda: meta('instance', (object,), {})
+
+
+@benchmark('nonlocal_getattr')
+def nonlocal_getattr():
+    nl = NonLocal(1)
+    return lambda: nl.real
+
+
+@benchmark('nonlocal_add')
+def nonlocal_add():
+    nl = NonLocal(1)
+    return lambda: nl + 1
@@ -0,0 +1,310 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import OrderedDict, namedtuple
+from weakref import ref
+
+from metautils.compat import Lock, get_ident, perf_counter
+
+
+CacheInfo = namedtuple(
+    'CacheInfo',
+    'hits misses evictions size maxsize build_time',
+)
+
+
+class _Flight(object):
+    """
+    A class being built by one thread that other threads may wait for.
+    """
+    __slots__ = ('_done', '_owner', '_cls')
+
+    def __init__(self):
+        self._done = Lock()
+        self._done.acquire()
+        self._owner = get_ident()
+        self._cls = None
+
+    def wait(self):
+        """
+        Wait for the build to finish.
+
+        Returns
+        -------
+        cls : type or None
+            The class that was built, or `None` if the build failed.
+        """
+        if self._owner == get_ident():
+            raise RuntimeError(
+                'recursive instantiation of the same base and arguments',
+            )
+
+        with self._done:
+            return self._cls
+
+    def finish(self, cls):
+        self._cls = cls
+        self._done.release()
+
+
+class InstantiationCache(object):
+    """
+    A cache of the classes constructed by a template.
+
+    Entries are keyed on a base class and a hashable key for the rest of the
+    template arguments. The base is held weakly so that the cache does not
+    keep dynamically created classes alive, and the cached classes are held
+    weakly so that a class that is no longer used can be collected with its
+    base. While a class is alive, looking up the same base and key will
+    always return that class.
+
+    The cache is safe to use from multiple threads, including on builds of
+    CPython without the GIL. Each class is built exactly once, though the
+    statistics are updated without a lock on the hit path and may be
+    approximate under contention.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        The number of most recently used classes to hold strong references
+        to. These classes are kept alive even if nothing else is using them.
+        If this is `None`, only weak references are held.
+    """
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        # {ref(base): {key: ref(cls)}}
+        self._entries = {}
+        # {(ref(base), key): cls} in least to most recently used order.
+        self._recent = OrderedDict()
+        # {(ref(base), key): cls} for the classes that are always held.
+        self._pinned = {}
+        self._lock = Lock()
+        # {(ref(base), key): _Flight} for the classes being built.
+        self._flights = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # The total time in seconds spent building classes on a miss.
+        self.build_time = 0.0
+
+        def remove(base_ref, selfref=ref(self)):
+            self = selfref()
+            if self is not None:
+                self._entries.pop(base_ref, None)
+
+        self._remove = remove
+
+    def _lookup(self, base, key):
+        try:
+            return self._entries[ref(base)][key]()
+        except KeyError:
+            return None
+        except TypeError:
+            # `base` cannot be weakly referenced.
+            try:
+                return self._entries[base][key]()
+            except KeyError:
+                return None
+
+    def get(self, base, key):
+        """
+        Look up the class cached for `base` and `key`.
+
+        Returns
+        -------
+        cls : type or None
+            The cached class or `None` if there is no live class cached.
+        """
+        cls = self._lookup(base, key)
+        if cls is not None and self.maxsize:
+            self._touch(base, key, cls)
+        return cls
+
+    def _touch(self, base, key, cls):
+        """
+        Mark `cls` as the most recently used class.
+        """
+        with self._lock:
+            recent_key = self._base_ref(base), key
+            self._recent.pop(recent_key, None)
+            self._hold(recent_key, cls)
+
+    def setdefault(self, base, key, cls):
+        """
+        Cache `cls` for `base` and `key` unless there is already a live class
+        cached.
+
+        Returns
+        -------
+        cls : type
+            The class that is cached for `base` and `key`.
+        """
+        with self._lock:
+            return self._store(base, key, cls)
+
+    def _store(self, base, key, cls):
+        """
+        The implementation of `setdefault`. The lock must be held.
+        """
+        base_ref = self._base_ref(base, self._remove)
+        entries = self._entries.setdefault(base_ref, {})
+        try:
+            cached = entries[key]()
+        except KeyError:
+            cached = None
+
+        if cached is not None:
+            return cached
+
+        entries[key] = ref(cls)
+        if self.maxsize:
+            self._hold((base_ref, key), cls)
+
+        return cls
+
+    def get_or_build(self, base, key, build):
+        """
+        Look up the class cached for `base` and `key`, calling
+        `build(base, key)` to construct it on a miss.
+
+        Only one class is built for a given base and key at a time: threads
+        that miss while another thread is building the class wait for that
+        build and return the same class. Builds for different keys do not
+        wait on each other.
+        """
+        # This is `get` inlined, as it is the hot path.
+        try:
+            cls = self._entries[ref(base)][key]()
+        except (KeyError, TypeError):
+            cls = self._lookup(base, key)
+
+        if cls is not None:
+            if self.maxsize:
+                self._touch(base, key, cls)
+            self.hits += 1
+            return cls
+
+        return self._build(base, key, build)
+
+    def _build(self, base, key, build):
+        """
+        The miss path of `get_or_build`.
+        """
+        flight_key = self._base_ref(base), key
+        while True:
+            with self._lock:
+                cls = self._lookup(base, key)
+                if cls is not None:
+                    self.hits += 1
+                    return cls
+
+                flight = self._flights.get(flight_key)
+                if flight is None:
+                    flight = self._flights[flight_key] = _Flight()
+                    break
+
+            cls = flight.wait()
+            if cls is not None:
+                self.hits += 1
+                return cls
+            # The build failed, try again ourselves.
+
+        try:
+            start = perf_counter()
+            cls = build(base, key)
+            build_time = perf_counter() - start
+        except BaseException:
+            with self._lock:
+                del self._flights[flight_key]
+            flight.finish(None)
+            raise
+
+        with self._lock:
+            self.misses += 1
+            self.build_time += build_time
+            cls = self._store(base, key, cls)
+            del self._flights[flight_key]
+
+        flight.finish(cls)
+        return cls
+
+    def pin(self, entries):
+        """
+        Hold strong references to classes so that they stay cached until
+        the cache is cleared, regardless of `maxsize`.
+
+        Parameters
+        ----------
+        entries : iterable[(type, hashable, type)]
+            The base, key and class of each entry to pin. The classes are
+            cached if they are not already.
+        """
+        with self._lock:
+            for base, key, cls in entries:
+                cls = self._store(base, key, cls)
+                self._pinned[self._base_ref(base), key] = cls
+
+    @staticmethod
+    def _base_ref(base, callback=None):
+        """
+        A reference to `base` to key the entries on. This is `base` itself
+        if it cannot be weakly referenced.
+        """
+        try:
+            return ref(base, callback)
+        except TypeError:
+            return base
+
+    def _hold(self, recent_key, cls):
+        """
+        Hold a strong reference to `cls`, dropping the least recently used
+        class if the cache is full. The lock must be held.
+        """
+        recent = self._recent
+        recent[recent_key] = cls
+        if len(recent) > self.maxsize:
+            recent.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return sum(
+            cls_ref() is not None
+            for entries in list(self._entries.values())
+            for cls_ref in list(entries.values())
+        )
+
+    def info(self):
+        """
+        Returns the statistics of this cache as a `CacheInfo`.
+        """
+        return CacheInfo(
+            self.hits,
+            self.misses,
+            self.evictions,
+            len(self),
+            self.maxsize,
+            self.build_time,
+        )
+
+    def clear(self):
+        """
+        Remove all of the entries from the cache and reset the
+        statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._recent.clear()
+            self._pinned.clear()
+            self.hits = self.misses = self.evictions = 0
+            self.build_time = 0.0
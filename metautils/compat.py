@@ -12,10 +12,8 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import math
-import operator
-
 from sys import version_info
+from types import MethodType
 
 
 PY2 = version_info.major == 2
@@ -23,6 +21,8 @@ PY3 = not PY2
 
 if PY2:
     from functools32 import lru_cache
+    from thread import allocate_lock as Lock, get_ident
+    from time import time as perf_counter
 
     reduce = reduce  # noqa
 
@@ -39,7 +39,9 @@ if PY2:
         return dict_.itervalues()
 
 else:
+    from _thread import allocate_lock as Lock, get_ident
     from functools import lru_cache, reduce
+    from time import perf_counter
 
     def qualname(obj):
         """
@@ -54,336 +56,243 @@ else:
         return dict_.values()
 
 
-def _apply(a, b):
-    return b(a)
-
-
 def _composed_doc(fs):
     """
     Generate a docstring for the composition of fs.
     """
-    if not fs:
-        # Argument name for the docstring.
-        return 'n'
-
-    return '{f}({g})'.format(f=fs[0].__name__, g=_composed_doc(fs[1:]))
+    # 'n' is the argument name for the docstring.
+    return ''.join(f.__name__ + '(' for f in fs) + 'n' + ')' * len(fs)
 
 
-def compose(*fs):
+def _compile(fs):
     """
-    Compose functions together in order:
-
-    compose(f, g, h) = lambda n: f(g(h(n)))
+    Generate a function that calls each function in `fs` from last to
+    first with no intermediate frames.
     """
-    # Pull the iterator out into a tuple so we can call `composed`
-    # more than once.
-    rs = tuple(reversed(fs))
-
-    def composed(n):
-        return reduce(lambda a, b: b(a), rs, n)
-
-    # Attempt to make the function look pretty with
-    # a fresh docstring and name.
-    try:
-        composed.__doc__ = 'lambda n: ' + _composed_doc(fs)
-    except AttributeError:
-        # One of our callables does not have a `__name__`, whatever.
-        pass
-    else:
-        # We already know that for all `f` in `fs`, there exists `f.__name__`
-        composed.__name__ = '_of_'.join(f.__name__ for f in fs)
-
-    return composed
-
-
-_nlname = '_NonLocal__nl'
-
-
-class _MagicExpansionMeta(type):
+    names = ['_f%d' % n for n in range(len(fs))]
+    body = ''.join(
+        '        n = {f}(n)\n'.format(f=f) for f in reversed(names[1:])
+    )
+    source = (
+        'def make({args}):\n'
+        '    def composed(n):\n'
+        '{body}'
+        '        return {first}(n)\n'
+        '    return composed\n'
+    ).format(args=', '.join(names), body=body, first=names[0])
+
+    ns = {}
+    exec(source, ns)
+    return ns['make'](*fs)
+
+
+def _stages(fs):
     """
-    A metaclass for expanding the @reflected and @inplace decorators.
+    Flatten the stages of any compositions in `fs`.
     """
-    def __new__(mcls, name, bases, dict_):
-        for v in values(dict(dict_)):
-            aliases = getattr(v, '_aliases', ())
-            for alias in aliases:
-                dict_[alias] = v
-
-        return super(_MagicExpansionMeta, mcls).__new__(
-            mcls, name, bases, dict_,
-        )
-
+    for f in fs:
+        if isinstance(f, Composed):
+            for stage in f.stages:
+                yield stage
+        else:
+            yield f
 
-def _alias(f, prefix):
-    name = f.__name__
-    if not name.startswith('__') and name.endswith('__'):
-        raise ValueError('%s must be a dunder method' % name)
 
-    name = name[2:-2]
-    aliases = getattr(f, '_aliases', set())
-    aliases.add('__%s%s__' % (prefix, name))
-    f._aliases = aliases
-
-
-def _reflected(f):
+def _function(fs):
     """
-    Aliases this magic with the reflected version.
+    Build the function that calls each function in `fs` from last to
+    first.
     """
-    _alias(f, 'r')
-    return f
+    if not fs:
+        def composed(n):
+            return n
+    elif len(fs) == 1:
+        f, = fs
+
+        def composed(n):
+            return f(n)
+    elif len(fs) == 2:
+        f, g = fs
+
+        def composed(n):
+            return f(g(n))
+    elif len(fs) == 3:
+        f, g, h = fs
+
+        def composed(n):
+            return f(g(h(n)))
+    else:
+        # Longer compositions are compiled into a single function body.
+        composed = _compile(fs)
 
+    return composed
 
-def _inplace(f):
+
+class _Doc(object):
     """
-    Aliases this magic with the inplace version.
+    A `__doc__` that is the class docstring on the class and the
+    composition's generated docstring on instances.
     """
-    _alias(f, 'i')
-    return f
+    def __init__(self, doc):
+        self._doc = doc
 
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self._doc
+        return instance._doc
 
-class NonLocal(object):
-    """
-    NonLocal value for testing, backwards compat for py2.
+
+class Composed(object):
     """
-    def __init__(self, nl):
-        object.__setattr__(self, _nlname, nl)
+    The composition of functions, returned by `compose`.
 
-    def __getattribute__(self, attr):
-        if attr == _nlname:
-            return object.__getattribute__(self, attr)
+    Compositions are equal when they have equal stages and pickle as their
+    stages, so they can be used as cache keys and sent to other processes
+    when their stages can be.
 
-        return getattr(self.__nl, attr)
+    Attributes
+    ----------
+    stages : tuple[callable]
+        The functions, in the order they were passed to `compose`.
+    """
+    # `__call__` is a slot holding the function that calls the stages.
+    # Calling an instance looks it up on the type like any `__call__`, but
+    # calls the function directly instead of adding a frame for a python
+    # level `__call__` method.
+    __slots__ = ('stages', '__call__', '__name__', '_doc')
+
+    __doc__ = _Doc(__doc__)
+
+    def __init__(self, stages):
+        stages = tuple(stages)
+        self.stages = stages
+        self.__call__ = _function(stages)
+
+        # Attempt to make the composition look pretty with
+        # a fresh docstring and name.
+        try:
+            self._doc = 'lambda n: ' + _composed_doc(stages)
+        except AttributeError:
+            # One of our callables does not have a `__name__`, whatever.
+            self._doc = None
+            self.__name__ = 'composed'
+        else:
+            # We already know that for all `f` in `stages`, there exists
+            # `f.__name__`.
+            self.__name__ = '_of_'.join(f.__name__ for f in stages)
 
-    def __setattr__(self, attr, val):
-        return setattr(self.__nl, attr, val)
+    def __get__(self, instance, owner):
+        # Bind like a function so that compositions can be methods.
+        if instance is None:
+            return self
+        return MethodType(self, instance)
 
     def __eq__(self, other):
-        return self.__nl == other
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.stages == other.stages
 
     def __ne__(self, other):
-        return self.__nl != other
-
-    def __lt__(self, other):
-        return self.__nl < other
-
-    def __gt__(self, other):
-        return self.__nl > other
-
-    def __le__(self, other):
-        return self.__nl <= other
-
-    def __ge__(self, other):
-        return self.__nl >= other
-
-    def __pos__(self):
-        return +self.__nl
-
-    def __neg__(self):
-        return -self.__nl
-
-    def __abs__(self):
-        return abs(self.__nl)
-
-    def __invert__(self):
-        return ~self.__nl
-
-    def __round__(self):
-        return round(self.__nl)
-
-    def __floor__(self):
-        return math.floor(self.__nl)
-
-    def __ceil__(self):
-        return math.ceil(self.__nl)
-
-    def __trunc__(self):
-        return math.truc(self.__nl)
-
-    @_reflected
-    @_inplace
-    def __add__(self, other):
-        return self.__nl + other
-
-    @_reflected
-    @_inplace
-    def __sub__(self, other):
-        return self.__nl - other
-
-    @_reflected
-    @_inplace
-    def __mul__(self, other):
-        return self.__nl * other
-
-    @_reflected
-    @_inplace
-    def __floordiv__(self, other):
-        return self.__nl // other
-
-    @_reflected
-    @_inplace
-    def __div__(self, other):
-        return self.__nl / other
-
-    @_reflected
-    @_inplace
-    def __truediv__(self, other):
-        return operator.truediv(self.__nl, other)
-
-    @_reflected
-    @_inplace
-    def __mod__(self, other):
-        return self.__nl % other
-
-    @_reflected
-    @_inplace
-    def __divmod__(self, other):
-        return divmod(self.__nl, other)
-
-    @_reflected
-    @_inplace
-    def __pow__(self, other):
-        return self.__nl ** other
-
-    @_reflected
-    @_inplace
-    def __lshift__(self, other):
-        return self.__nl << other
-
-    @_reflected
-    @_inplace
-    def __rshift__(self, other):
-        return self.__nl >> other
-
-    @_reflected
-    @_inplace
-    def __and__(self, other):
-        return self.__nl & other
-
-    @_reflected
-    @_inplace
-    def __or__(self, other):
-        return self.__nl | other
-
-    @_reflected
-    @_inplace
-    def __xor__(self, other):
-        return self.__nl ^ other
-
-    def __int__(self):
-        return int(self.__nl)
-
-    def __float__(self):
-        return float(self.__nl)
-
-    def __complex__(self):
-        return complex(self.__nl)
-
-    def __oct__(self):
-        return oct(self.__nl)
-
-    def __hex__(self):
-        return hex(self.__nl)
-
-    def __index__(self):
-        return self.__nl.__index__()
-
-    def __str__(self):
-        return str(self.__nl)
-
-    def __bytes__(self):
-        return bytes(self.__nl)
-
-    def __repr__(self):
-        return repr(self.__nl)
-
-    def __format__(self, formatstr):
-        return self.__nl.__format__(formatstr)
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
 
     def __hash__(self):
-        return hash(self.__nl)
-
-    def __bool__(self):
-        return bool(self.__nl)
+        return hash(self.stages)
 
-    def __dir__(self):
-        return dir(self.__nl)
+    def __reduce__(self):
+        return type(self), (self.stages,)
 
-    def __delattr__(self, name):
-        return delattr(self.__nl, name)
-
-    def __len__(self):
-        return len(self.__nl)
-
-    def __getitem__(self, key):
-        return self.__nl[key]
-
-    def __setitem__(self, key, value):
-        self.__nl[key] = value
-
-    def __delitem__(self, key):
-        del self.__nl[key]
-
-    def __iter__(self):
-        return iter(self.__nl)
-
-    def __reversed__(self):
-        return reversed(self.__nl)
+    def __repr__(self):
+        return '<{cls}: {name}>'.format(
+            cls=type(self).__name__,
+            name=self.__name__,
+        )
 
-    def __contains__(self, item):
-        return item in self.__nl
+    # `batch` is only imported when these are used so that importing
+    # `compose` stays cheap.
 
-    def __missing__(self, key):
-        return self.__nl.__missing__[key]
+    def map(self, iterable, chunksize=None, executor=None):
+        """
+        Apply this composition to each item, see `metautils.batch.map`.
+        """
+        from metautils import batch
+        return batch.map(self, iterable, chunksize, executor)
 
-    def __instancecheck__(self, instance):
-        return isinstance(self.__nl, instance)
+    def imap(self, iterable, chunksize=None, executor=None):
+        """
+        Lazily apply this composition to each item, see
+        `metautils.batch.imap`.
+        """
+        from metautils import batch
+        return batch.imap(self, iterable, chunksize, executor)
 
-    def __call__(self, *args, **kwargs):
-        return self.__nl(*args, **kwargs)
+    def chunked(self, iterable, chunksize=None, executor=None):
+        """
+        Lazily apply this composition to each item in chunks, see
+        `metautils.batch.chunked`.
+        """
+        from metautils import batch
+        return batch.chunked(self, iterable, chunksize, executor)
 
-    def __enter__(self):
-        return self.__nl.__enter__()
 
-    def __exit__(self, exc_type, exc_value, exc_tb):
-        return self.__nl.__exit__(exc_type, exc_value, exc_tb)
+def compose(*fs):
+    """
+    Compose functions together in order:
 
-    def __get__(self, instance, owner):
-        return self.__nl.__get__(instance, owner)
+    compose(f, g, h) = lambda n: f(g(h(n)))
 
-    def __set__(self, instance, value):
-        return self.__nl.__get__(instance, value)
+    This returns a `Composed` object. Compositions passed to `compose` are
+    flattened into their stages.
 
-    def __delete__(self, instance):
-        return self.__nl.__delete__(instance)
+    The composition has the methods `map`, `imap` and `chunked` to apply it
+    to many items, optionally with a `concurrent.futures` executor, see
+    `metautils.batch`.
 
-    def __prepare__(self, name, bases):
-        return self.__nl.__prepare__(name, bases)
+    If the type of the first function defines a static `__compose__`
+    method, it is called with the functions and its result is returned
+    unless it is `NotImplemented`. Templates use this to compose into a
+    single template.
+    """
+    fs = tuple(_stages(fs))
+    if fs:
+        hook = getattr(type(fs[0]), '__compose__', None)
+        if hook is not None:
+            composed = hook(fs)
+            if composed is not NotImplemented:
+                return composed
 
-    def __next__(self):
-        return next(self.__nl)
+    return Composed(fs)
 
-    # PY2 support:
-    if PY2:
-        __nonzero__ = __bool__
-        # I can probably leave this; however, this is not the py2 convention.
-        del __bool__
 
-        def __coerce__(self, other):
-            return self.__nl.__coerce__(other)
+def __getattr__(name):
+    # `NonLocal` is expensive to build, so it is only imported when it is
+    # used. Module `__getattr__` requires Python 3.7; older versions import
+    # it eagerly below.
+    if name == 'NonLocal':
+        from metautils.nonlocal_ import NonLocal
+        return NonLocal
 
-    @staticmethod
-    def reassign(nl, val):
-        object.__setattr__(nl, _nlname, val)
+    raise AttributeError(
+        'module {0!r} has no attribute {1!r}'.format(__name__, name),
+    )
 
 
 __all__ = [
+    'Composed',
+    'Lock',
     'NonLocal',
     'PY2',
     'PY3',
     'compose',
+    'get_ident',
     'items',
     'lru_cache',
+    'perf_counter',
     'qualname',
     'reduce',
     'values',
 ]
+
+
+if version_info < (3, 7):
+    from metautils.nonlocal_ import NonLocal  # noqa
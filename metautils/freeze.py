@@ -0,0 +1,535 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Generate python modules with the classes built by templates written out as
+ordinary class statements.
+
+Run `python -m metautils.freeze module:Template,module:Base ...` to write
+the module.
+
+Each class statement has the template's members with the `templated`
+methods' `T_` argument defaulting to the base, so importing the module does
+not run the templates. Methods are copied from their source and the globals
+they use are imported or, for literals, assigned. Members that cannot be
+written out this way, such as closures, are looked up on the template
+instead, which imports the module defining it.
+"""
+from argparse import ArgumentParser
+import ast
+import inspect
+from importlib import import_module
+import sys
+import textwrap
+from types import CodeType, FunctionType
+
+from metautils.compat import items
+from metautils.template import (
+    TemplateBase,
+    TemplateChain,
+    _compact_slots,
+    _templated_members,
+    origin,
+)
+
+try:
+    import builtins
+except ImportError:  # pragma: no cover
+    import __builtin__ as builtins
+
+
+_header = '''\
+# This module was generated by `python -m metautils.freeze`, do not edit.
+'''
+
+# Class body entries that are not written out.
+_skip = frozenset({'__module__', '__qualname__', '__classcell__', '__doc__'})
+
+
+def _literal(value):
+    """
+    Returns the source for `value` if it is a literal, otherwise `None`.
+    """
+    text = repr(value)
+    try:
+        evaluated = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return None
+
+    if type(evaluated) is not type(value) or evaluated != value:
+        return None
+    return text
+
+
+def _statement(source):
+    return ast.parse(source).body[0]
+
+
+def _code_names(code):
+    """
+    The global names that `code` and the code nested in it may use.
+    """
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            names |= _code_names(const)
+    return names
+
+
+def _signature_names(fdef):
+    """
+    The global names that the defaults and annotations of the function
+    definition `fdef` may use. These are evaluated when the function is
+    defined, so they are not in its code.
+    """
+    args = fdef.args
+    nodes = list(args.defaults)
+    nodes.extend(d for d in args.kw_defaults if d is not None)
+    for arg in (args.posonlyargs + args.args + args.kwonlyargs +
+                [args.vararg, args.kwarg]):
+        if arg is not None and arg.annotation is not None:
+            nodes.append(arg.annotation)
+    if fdef.returns is not None:
+        nodes.append(fdef.returns)
+
+    return {
+        node.id
+        for expr in nodes
+        for node in ast.walk(expr)
+        if isinstance(node, ast.Name)
+    }
+
+
+class _Module(object):
+    """
+    The module being generated.
+    """
+    def __init__(self):
+        self.imports = []
+        # The globals bound to literals and imports, and the globals bound
+        # to the classes, which must come after them.
+        self.bindings = []
+        self.class_bindings = []
+        # {name: value} for the names bound at module scope.
+        self.globals = {}
+        self.classes = []
+        # {cls: name} for the classes written out.
+        self.frozen = {}
+        self.exports = []
+
+    def _fresh(self, name):
+        """
+        Returns `name` or a variant of it that is not used yet.
+        """
+        candidate = name
+        n = 1
+        while candidate in self.globals:
+            n += 1
+            candidate = '{0}_{1}'.format(name, n)
+        return candidate
+
+    def reference(self, obj):
+        """
+        Returns an expression that evaluates to `obj` in the module.
+
+        Raises
+        ------
+        ValueError
+            Raised when `obj` cannot be referred to.
+        """
+        try:
+            return self.frozen[obj]
+        except (KeyError, TypeError):
+            pass
+
+        if isinstance(obj, type):
+            built = origin(obj)
+            if built is not None:
+                template, base, adjust_name = built
+                return self.add(template, base, adjust_name)
+
+        if isinstance(obj, TemplateBase) and not isinstance(
+                obj, TemplateChain):
+            module = obj._plan.module
+            qualname = obj._plan.qualname
+        else:
+            module = getattr(obj, '__module__', None)
+            qualname = getattr(
+                obj,
+                '__qualname__',
+                getattr(obj, '__name__', None),
+            )
+
+        if (module is None or
+                qualname is None or
+                not all(part.isidentifier() for part in qualname.split('.'))):
+            raise ValueError('cannot refer to {0!r}'.format(obj))
+
+        if module in ('builtins', '__builtin__'):
+            if getattr(builtins, qualname, None) is obj:
+                return qualname
+
+        resolved = import_module(module)
+        for part in qualname.split('.'):
+            resolved = getattr(resolved, part, None)
+        if resolved is not obj:
+            raise ValueError('cannot refer to {0!r}'.format(obj))
+
+        first, _, rest = qualname.partition('.')
+        # Aliases must not start with two underscores, or they would be
+        # name mangled in the class bodies that use them.
+        alias = self._fresh('_frozen_' + first.lstrip('_'))
+        self.imports.append(
+            'from {0} import {1} as {2}'.format(module, first, alias),
+        )
+        self.globals[alias] = obj
+        self.frozen[obj] = expr = '.'.join(filter(None, (alias, rest)))
+        return expr
+
+    def _bind_global(self, name, value, module):
+        """
+        Bind a global that a function defined in `module` uses.
+
+        Returns
+        -------
+        bound : bool
+            Whether `name` refers to `value` in the generated module.
+        """
+        if name in self.globals:
+            return self.globals[name] is value
+
+        expr = _literal(value)
+        if expr is None:
+            try:
+                expr = self.reference(value)
+            except ValueError:
+                pass
+            if name in self.globals:
+                # `reference` used the name.
+                return self.globals[name] is value
+
+        if expr is None:
+            # Fall back to the global of the module defining the function.
+            self.imports.append('from {0} import {1}'.format(module, name))
+        elif expr != name:
+            binding = '{0} = {1}'.format(name, expr)
+            if expr.partition('.')[0] in self.exports:
+                self.class_bindings.append(binding)
+            else:
+                self.bindings.append(binding)
+
+        self.globals[name] = value
+        return True
+
+    def function(self, f, name, T_=None, decorators=()):
+        """
+        The definition of a method, or `None` if it cannot be written out.
+
+        Parameters
+        ----------
+        f : function
+            The function.
+        name : str
+            The name to define the method under.
+        T_ : str, optional
+            The expression to default the `T_` argument to.
+        decorators : iterable[str], optional
+            The decorators to apply.
+        """
+        if not isinstance(f, FunctionType) or f.__closure__:
+            return None
+
+        try:
+            source = textwrap.dedent(inspect.getsource(f))
+            tree = ast.parse(source)
+        except (OSError, IOError, TypeError, SyntaxError):
+            return None
+
+        fdef = tree.body[0]
+        if not isinstance(fdef, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return None
+
+        fdef.name = name
+        fdef.decorator_list = [ast.Name(id=d, ctx=ast.Load())
+                               for d in decorators]
+        # Read the names in the signature before `T_` is given a default
+        # that is already bound.
+        names = _code_names(f.__code__) | _signature_names(fdef)
+        if T_ is not None and not self._default_T(fdef.args, T_):
+            return None
+
+        for global_ in sorted(names):
+            if global_ in f.__globals__ and not self._bind_global(
+                    global_,
+                    f.__globals__[global_],
+                    f.__module__):
+                return None
+
+        return fdef
+
+    @staticmethod
+    def _default_T(args, T_):
+        """
+        Make the `T_` argument of a function keyword only with a default of
+        `T_`, like the 'bind' dispatch does.
+        """
+        default = ast.parse(T_, mode='eval').body
+        for ix, arg in enumerate(args.kwonlyargs):
+            if arg.arg == 'T_':
+                args.kw_defaults[ix] = default
+                return True
+
+        if not args.args or args.args[-1].arg != 'T_':
+            return False
+
+        if args.defaults:
+            # `defaults` line up with the last `len(defaults)` arguments.
+            args.defaults.pop()
+        args.kwonlyargs.insert(0, args.args.pop())
+        args.kw_defaults.insert(0, default)
+        return True
+
+    def add(self, template, base, adjust_name=True):
+        """
+        Write out the class built by calling `template` with `base` and
+        `adjust_name`.
+
+        Returns
+        -------
+        name : str
+            The name of the class in the module.
+        """
+        if isinstance(template, TemplateChain):
+            if template.flatten:
+                raise TypeError('flattened chains cannot be frozen')
+            for layer in reversed(template.templates):
+                name = self.add(layer, base, adjust_name)
+                base = layer(base, adjust_name)
+            return name
+
+        cls = template(base, adjust_name)
+        try:
+            return self.frozen[cls]
+        except KeyError:
+            pass
+
+        plan = template._plan
+        dict_ = plan.namespace.copy()
+        bases = (base,) + plan.bases
+        name = plan.name
+        members = plan.templated
+        if plan.preprocess is not None:
+            name, bases, dict_ = plan.preprocess(name, bases, dict_)
+            members = _templated_members(dict_)
+        if plan.slots is not None and '__slots__' not in dict_:
+            dict_['__slots__'] = _compact_slots(plan.slots, bases)
+        if adjust_name:
+            name = base.__name__ + name
+
+        base_exprs = [self.reference(b) for b in bases]
+        T_ = base_exprs[0]
+        decorators = [self.reference(d) for d in plan.decorators]
+        templated = dict(members)
+
+        body = []
+        doc = dict_.get('__doc__')
+        if doc is not None:
+            body.append(ast.Expr(value=ast.Constant(value=doc)))
+
+        for k, v in items(dict_):
+            if k in _skip:
+                continue
+            if k in templated:
+                source = self.function(templated[k], k, T_=T_)
+                if source is None:
+                    tmpl = self.reference(template)
+                    source = _statement(
+                        '{k} = {tmpl}._plan.close('
+                        '{tmpl}._plan.namespace[{k!r}].unboxed, {T_})'.format(
+                            k=k,
+                            tmpl=tmpl,
+                            T_=T_,
+                        )
+                    )
+                body.append(source)
+                continue
+
+            source = None
+            if isinstance(v, FunctionType):
+                source = self.function(v, k)
+            elif isinstance(v, (staticmethod, classmethod)):
+                source = self.function(
+                    v.__func__,
+                    k,
+                    decorators=(type(v).__name__,),
+                )
+            if source is None:
+                source = self._value(template, k, v)
+            body.append(source)
+
+        name = self._fresh(name)
+        self.globals[name] = cls
+        self.frozen[cls] = name
+        self.exports.append(name)
+        cdef = _statement('class {0}({1}):\n    pass'.format(
+            name,
+            ', '.join(base_exprs),
+        ))
+        cdef.decorator_list = [
+            ast.parse(d, mode='eval').body for d in decorators
+        ]
+        if body:
+            cdef.body = body
+        self.classes.append(ast.unparse(cdef))
+        return name
+
+    def _value(self, template, k, v):
+        """
+        The source that assigns a class attribute that is not a function.
+        """
+        literal = _literal(v)
+        if literal is None:
+            try:
+                literal = self.reference(v)
+            except ValueError:
+                if template._plan.namespace.get(k) is not v:
+                    raise ValueError(
+                        'cannot freeze {0}={1!r} of {2!r}'.format(
+                            k,
+                            v,
+                            template,
+                        ),
+                    )
+                literal = '{0}._plan.namespace[{1!r}]'.format(
+                    self.reference(template),
+                    k,
+                )
+        return _statement('{0} = {1}'.format(k, literal))
+
+    def source(self):
+        sections = [_header.rstrip('\n')]
+        if self.imports:
+            sections.append('\n'.join(self.imports))
+        # The globals of the methods are bound before the classes, which
+        # may use them in defaults and annotations, except for the ones that
+        # refer to the classes.
+        if self.bindings:
+            sections.append('\n'.join(self.bindings))
+        sections.extend(self.classes)
+        if self.class_bindings:
+            sections.append('\n'.join(self.class_bindings))
+        sections.append('__all__ = [\n{0}]'.format(
+            ''.join('    {0!r},\n'.format(name) for name in self.exports),
+        ))
+        return '\n\n\n'.join(sections) + '\n'
+
+
+def freeze(pairs, adjust_name=True):
+    """
+    Generate the source of a module with the classes built by templates
+    written out as class statements.
+
+    This requires Python 3.9 or later.
+
+    Parameters
+    ----------
+    pairs : iterable[(Template, type)]
+        The templates and the bases to write out the classes for. Classes
+        built by templates that these classes depend on are also written.
+    adjust_name : bool, optional
+        The `adjust_name` argument to pass to the templates.
+
+    Returns
+    -------
+    source : str
+        The source of the module.
+    """
+    if not hasattr(ast, 'unparse'):
+        raise RuntimeError('freezing templates requires Python 3.9')
+
+    module = _Module()
+    for template, base in pairs:
+        module.add(template, base, adjust_name)
+    return module.source()
+
+
+def _resolve(path):
+    """
+    Import an object from a 'module:qualname' path.
+    """
+    module, sep, qualname = path.partition(':')
+    if not sep:
+        raise ValueError(
+            'expected module:qualname, got {0!r}'.format(path),
+        )
+
+    obj = import_module(module)
+    for part in qualname.split('.'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def main(argv=None):
+    parser = ArgumentParser(
+        prog='python -m metautils.freeze',
+        description=(
+            'Write a module with the classes built by templates as class'
+            ' statements.'
+        ),
+    )
+    parser.add_argument(
+        'pairs',
+        nargs='+',
+        metavar='TEMPLATE,BASE',
+        help=(
+            'A template and a base to freeze, each given as'
+            ' module:qualname.'
+        ),
+    )
+    parser.add_argument(
+        '-o', '--output',
+        help='The file to write the module to. Defaults to stdout.',
+    )
+    parser.add_argument(
+        '--no-adjust-name',
+        dest='adjust_name',
+        action='store_false',
+        help="Do not prepend the base's name to the class names.",
+    )
+    args = parser.parse_args(argv)
+
+    pairs = []
+    for pair in args.pairs:
+        template, sep, base = pair.partition(',')
+        if not sep:
+            parser.error('expected TEMPLATE,BASE, got {0!r}'.format(pair))
+        pairs.append((_resolve(template), _resolve(base)))
+
+    source = freeze(pairs, adjust_name=args.adjust_name)
+    if args.output is None:
+        sys.stdout.write(source)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(source)
+
+    return 0
+
+
+__all__ = [
+    'freeze',
+]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Observers for template instantiation and `templated` method calls.
+
+Templates only check whether any observers are registered, so there is no
+other cost while none are.
+"""
+from collections import namedtuple
+
+
+InstantiationEvent = namedtuple(
+    'InstantiationEvent',
+    'template base adjust_name cls cache_hit'
+    ' preprocess_time build_time decorator_times',
+)
+InstantiationEvent.__doc__ = """
+A call to a template.
+
+Attributes
+----------
+template : Template
+    The template that was called.
+base : type
+    The base that the template was called with.
+adjust_name : bool
+    The `adjust_name` argument.
+cls : type
+    The class that the call returned.
+cache_hit : bool
+    Whether the class came from the instantiation cache. When this is true
+    the times are all 0.
+preprocess_time : float
+    The seconds spent in the template's `preprocess` function.
+build_time : float
+    The seconds spent binding the `templated` methods and creating the
+    class, excluding the decorators.
+decorator_times : tuple[(callable, float)]
+    Each class decorator with the seconds spent in it, in the order they
+    were applied.
+"""
+
+DispatchEvent = namedtuple('DispatchEvent', 'template name base time')
+DispatchEvent.__doc__ = """
+A call to a `templated` method.
+
+Attributes
+----------
+template : Template
+    The template that defined the method.
+name : str
+    The name of the method.
+base : type
+    The template argument passed to the method as `T_`.
+time : float
+    The seconds spent in the method.
+"""
+
+
+_instantiation_hooks = []
+_dispatch_hooks = []
+
+
+def add_instantiation_hook(hook):
+    """
+    Register a function to be called with an `InstantiationEvent` each time
+    a template is called.
+
+    This may be used as a decorator.
+    """
+    _instantiation_hooks.append(hook)
+    return hook
+
+
+def remove_instantiation_hook(hook):
+    """
+    Unregister a function registered with `add_instantiation_hook`.
+    """
+    _instantiation_hooks.remove(hook)
+
+
+def add_dispatch_hook(hook):
+    """
+    Register a function to be called with a `DispatchEvent` each time a
+    `templated` method is called.
+
+    Methods are only observed in classes that templates build while a
+    dispatch hook is registered; classes that were already built, including
+    ones returned from the instantiation cache, are unchanged. This keeps
+    the methods free of any overhead when no hooks are used.
+
+    This may be used as a decorator.
+    """
+    _dispatch_hooks.append(hook)
+    return hook
+
+
+def remove_dispatch_hook(hook):
+    """
+    Unregister a function registered with `add_dispatch_hook`.
+    """
+    _dispatch_hooks.remove(hook)
+
+
+def _notify(hooks, event):
+    for hook in list(hooks):
+        hook(event)
+
+
+__all__ = [
+    'DispatchEvent',
+    'InstantiationEvent',
+    'add_dispatch_hook',
+    'add_instantiation_hook',
+    'remove_dispatch_hook',
+    'remove_instantiation_hook',
+]
@@ -0,0 +1,225 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Inspect the live templates and the classes they have built.
+
+Run `python -m metautils.inspect module ...` to import some modules and
+print a report of the templates they created.
+"""
+from argparse import ArgumentParser
+from collections import OrderedDict
+import gc
+from importlib import import_module
+import json
+import sys
+from types import FunctionType
+from weakref import ref
+
+from metautils.template import TemplateChain, _origins, templates
+
+
+def template_name(template):
+    """
+    Returns a readable name for a template.
+    """
+    if isinstance(template, TemplateChain):
+        return '{cls}({templates}{flatten})'.format(
+            cls=type(template).__name__,
+            templates=', '.join(map(template_name, template.templates)),
+            flatten=', flatten=True' if template.flatten else '',
+        )
+
+    plan = template._plan
+    return '{0}.{1}'.format(plan.module, plan.qualname)
+
+
+def _class_name(cls):
+    return '{0}.{1}'.format(
+        cls.__module__,
+        getattr(cls, '__qualname__', cls.__name__),
+    )
+
+
+def _wrapper_size(f):
+    """
+    The size of a function built to pass `T_` to a `templated` method,
+    including the argument defaults and closure that hold `T_`.
+    """
+    size = sys.getsizeof(f)
+    for attr in ('__defaults__', '__kwdefaults__', '__closure__'):
+        value = getattr(f, attr, None)
+        if value is not None:
+            size += sys.getsizeof(value)
+    for cell in f.__closure__ or ():
+        size += sys.getsizeof(cell)
+    return size
+
+
+def class_size(cls):
+    """
+    Estimate the memory used by a class.
+
+    Returns
+    -------
+    size : dict
+        The size in bytes of the class object, its namespace dict, the
+        wrappers of its `templated` methods, and the total.
+    """
+    # `cls.__dict__` is a proxy, the dict itself is its only referent.
+    namespace, = gc.get_referents(cls.__dict__)
+    wrappers = sum(
+        _wrapper_size(value)
+        for value in namespace.values()
+        if isinstance(value, FunctionType) and hasattr(value, '__wrapped__')
+    )
+    class_ = sys.getsizeof(cls)
+    namespace_ = sys.getsizeof(namespace)
+    return OrderedDict([
+        ('class', class_),
+        ('namespace', namespace_),
+        ('wrappers', wrappers),
+        ('total', class_ + namespace_ + wrappers),
+    ])
+
+
+def snapshot():
+    """
+    Collect the live templates and the classes they have built.
+
+    Returns
+    -------
+    report : list[dict]
+        A json serializable record for each template, ordered by name, with
+        its cache statistics and its live classes. Each class records its
+        base, the MRO depth, its size from `class_size` and the seconds it
+        took to build.
+    """
+    classes = {}
+    for cls, (template, base, adjust_name, build_time) in list(
+            _origins.items()):
+        if isinstance(base, ref):
+            base = base()
+        classes.setdefault(template, []).append(OrderedDict([
+            ('name', _class_name(cls)),
+            ('base', _class_name(base)),
+            ('adjust_name', adjust_name),
+            ('mro_depth', len(cls.__mro__)),
+            ('size', class_size(cls)),
+            ('build_time', build_time),
+        ]))
+
+    report = []
+    for template in templates():
+        info = template.cache_info()
+        built = sorted(
+            classes.get(template, ()),
+            key=lambda record: record['name'],
+        )
+        report.append(OrderedDict([
+            ('template', template_name(template)),
+            ('cache', None if info is None else OrderedDict(
+                zip(info._fields, info),
+            )),
+            ('size', sum(record['size']['total'] for record in built)),
+            ('classes', built),
+        ]))
+
+    report.sort(key=lambda record: record['template'])
+    return report
+
+
+def format_text(report):
+    """
+    Format a report from `snapshot` as text.
+    """
+    lines = []
+    for record in report:
+        lines.append(record['template'])
+        lines.append('  classes: {n}, size: {size} bytes'.format(
+            n=len(record['classes']),
+            size=record['size'],
+        ))
+        cache = record['cache']
+        if cache is None:
+            lines.append('  cache: disabled')
+        else:
+            lines.append(
+                '  cache: {hits} hits, {misses} misses, {evictions}'
+                ' evictions, {build_time:.6f}s building'.format(**cache),
+            )
+        for cls in record['classes']:
+            lines.append(
+                '  {name}\n'
+                '    base: {base}, mro depth: {mro_depth},'
+                ' size: {total} bytes, built in {build_time:.6f}s'.format(
+                    total=cls['size']['total'],
+                    **cls
+                ),
+            )
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = ArgumentParser(
+        prog='python -m metautils.inspect',
+        description=(
+            'Import modules and report the templates and the classes they'
+            ' built.'
+        ),
+    )
+    parser.add_argument(
+        'modules',
+        nargs='*',
+        help='The modules to import before inspecting.',
+    )
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='Write the report as json instead of text.',
+    )
+    parser.add_argument(
+        '-o', '--output',
+        help='The file to write the report to. Defaults to stdout.',
+    )
+    args = parser.parse_args(argv)
+
+    for module in args.modules:
+        import_module(module)
+
+    report = snapshot()
+    if args.json:
+        out = json.dumps(report, indent=2)
+    else:
+        out = format_text(report)
+
+    if args.output is None:
+        sys.stdout.write(out + '\n')
+    else:
+        with open(args.output, 'w') as f:
+            f.write(out + '\n')
+
+    return 0
+
+
+__all__ = [
+    'class_size',
+    'format_text',
+    'snapshot',
+    'template_name',
+]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from metautils.template import templates
+
+
+_exporters = []
+
+
+def cache_stats():
+    """
+    Returns the instantiation cache statistics of every live template.
+
+    Returns
+    -------
+    stats : list[(Template, CacheInfo)]
+        The templates paired with their cache statistics. Templates with
+        the cache disabled are not included.
+    """
+    stats = []
+    for template in templates():
+        info = template.cache_info()
+        if info is not None:
+            stats.append((template, info))
+    return stats
+
+
+def add_exporter(exporter):
+    """
+    Register a function to be called with the result of `cache_stats` each
+    time `export` is called.
+
+    This may be used as a decorator.
+    """
+    _exporters.append(exporter)
+    return exporter
+
+
+def remove_exporter(exporter):
+    """
+    Unregister a function registered with `add_exporter`.
+    """
+    _exporters.remove(exporter)
+
+
+def export():
+    """
+    Collect the cache statistics and pass them to each registered exporter.
+
+    Returns
+    -------
+    stats : list[(Template, CacheInfo)]
+        The statistics that were exported.
+    """
+    stats = cache_stats()
+    for exporter in list(_exporters):
+        exporter(stats)
+    return stats
+
+
+__all__ = [
+    'add_exporter',
+    'cache_stats',
+    'export',
+    'remove_exporter',
+]
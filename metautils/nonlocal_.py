@@ -0,0 +1,405 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import math
+import operator
+from weakref import WeakKeyDictionary, ref
+
+from metautils.compat import PY2, items
+
+
+_nlname = '_NonLocal__nl'
+
+
+def _expand_magic(cls):
+    """
+    Class decorator for expanding the @reflected and @inplace decorators.
+    """
+    for name, v in list(items(vars(cls))):
+        reflected = getattr(v, '_reflected', None)
+        if reflected is not None:
+            setattr(cls, _magic_name('r', name), _make_reflected(reflected))
+
+        inplace = getattr(v, '_inplace', None)
+        if inplace is not None:
+            setattr(cls, _magic_name('i', name), _make_inplace(inplace))
+
+    return cls
+
+
+def _magic_name(prefix, name):
+    if not (name.startswith('__') and name.endswith('__')):
+        raise ValueError('%s must be a dunder method' % name)
+
+    return '__%s%s__' % (prefix, name[2:-2])
+
+
+def _make_reflected(op):
+    def reflected(self, other):
+        return op(other, _get_nl(self))
+
+    return reflected
+
+
+def _make_inplace(op):
+    def inplace(self, other):
+        # `op` is the in place operator, so a wrapped value that implements
+        # it, like a list or array, is mutated instead of copied.
+        NonLocal.reassign(self, op(_get_nl(self), other))
+        return self
+
+    return inplace
+
+
+def _reflected(op):
+    """
+    Adds the reflected version of this magic, implemented with `op`.
+    """
+    def dec(f):
+        f._reflected = op
+        return f
+
+    return dec
+
+
+def _inplace(op):
+    """
+    Adds the inplace version of this magic, implemented with `op`. The
+    inplace version updates the wrapped value and returns the `NonLocal`.
+    """
+    def dec(f):
+        f._inplace = op
+        return f
+
+    return dec
+
+
+@_expand_magic
+class NonLocal(object):
+    """
+    NonLocal value for testing, backwards compat for py2.
+
+    A `NonLocal` is a proxy for the value it wraps. Instances are created as
+    a subclass of `NonLocal` specialized for the type of the wrapped value,
+    see `_proxy_type`.
+    """
+    __slots__ = ('__nl',)
+    # A weak reference to the type of the value wrapped by a proxy type. The
+    # proxy type must not hold the type strongly, or it would keep its own
+    # key alive in `_proxy_types`.
+    _wrapped_ref = None
+
+    def __new__(cls, nl):
+        self = object.__new__(_proxy_type(type(nl)))
+        _set_nl(self, nl)
+        return self
+
+    # Report the type of the wrapped value so that `isinstance` sees through
+    # the proxy.
+    __class__ = property(operator.attrgetter(_nlname + '.__class__'))
+
+    def __getattr__(self, attr):
+        if attr == _nlname:
+            # The value has not been set yet, don't recurse.
+            raise AttributeError(attr)
+        return getattr(self.__nl, attr)
+
+    def __reduce__(self):
+        return NonLocal, (self.__nl,)
+
+    def __setattr__(self, attr, val):
+        return setattr(self.__nl, attr, val)
+
+    def __eq__(self, other):
+        return self.__nl == other
+
+    def __ne__(self, other):
+        return self.__nl != other
+
+    def __lt__(self, other):
+        return self.__nl < other
+
+    def __gt__(self, other):
+        return self.__nl > other
+
+    def __le__(self, other):
+        return self.__nl <= other
+
+    def __ge__(self, other):
+        return self.__nl >= other
+
+    def __pos__(self):
+        return +self.__nl
+
+    def __neg__(self):
+        return -self.__nl
+
+    def __abs__(self):
+        return abs(self.__nl)
+
+    def __invert__(self):
+        return ~self.__nl
+
+    def __round__(self, *ndigits):
+        return round(self.__nl, *ndigits)
+
+    def __floor__(self):
+        return math.floor(self.__nl)
+
+    def __ceil__(self):
+        return math.ceil(self.__nl)
+
+    def __trunc__(self):
+        return math.trunc(self.__nl)
+
+    @_reflected(operator.add)
+    @_inplace(operator.iadd)
+    def __add__(self, other):
+        return self.__nl + other
+
+    @_reflected(operator.sub)
+    @_inplace(operator.isub)
+    def __sub__(self, other):
+        return self.__nl - other
+
+    @_reflected(operator.mul)
+    @_inplace(operator.imul)
+    def __mul__(self, other):
+        return self.__nl * other
+
+    @_reflected(operator.floordiv)
+    @_inplace(operator.ifloordiv)
+    def __floordiv__(self, other):
+        return self.__nl // other
+
+    if PY2:
+        @_reflected(getattr(operator, 'div', None))
+        @_inplace(getattr(operator, 'idiv', None))
+        def __div__(self, other):
+            return self.__nl / other
+
+    @_reflected(operator.truediv)
+    @_inplace(operator.itruediv)
+    def __truediv__(self, other):
+        return operator.truediv(self.__nl, other)
+
+    @_reflected(operator.mod)
+    @_inplace(operator.imod)
+    def __mod__(self, other):
+        return self.__nl % other
+
+    @_reflected(divmod)
+    def __divmod__(self, other):
+        return divmod(self.__nl, other)
+
+    @_reflected(operator.pow)
+    @_inplace(operator.ipow)
+    def __pow__(self, other):
+        return self.__nl ** other
+
+    @_reflected(operator.lshift)
+    @_inplace(operator.ilshift)
+    def __lshift__(self, other):
+        return self.__nl << other
+
+    @_reflected(operator.rshift)
+    @_inplace(operator.irshift)
+    def __rshift__(self, other):
+        return self.__nl >> other
+
+    @_reflected(operator.and_)
+    @_inplace(operator.iand)
+    def __and__(self, other):
+        return self.__nl & other
+
+    @_reflected(operator.or_)
+    @_inplace(operator.ior)
+    def __or__(self, other):
+        return self.__nl | other
+
+    @_reflected(operator.xor)
+    @_inplace(operator.ixor)
+    def __xor__(self, other):
+        return self.__nl ^ other
+
+    def __int__(self):
+        return int(self.__nl)
+
+    def __float__(self):
+        return float(self.__nl)
+
+    def __complex__(self):
+        return complex(self.__nl)
+
+    def __oct__(self):
+        return oct(self.__nl)
+
+    def __hex__(self):
+        return hex(self.__nl)
+
+    def __index__(self):
+        return self.__nl.__index__()
+
+    def __str__(self):
+        return str(self.__nl)
+
+    def __bytes__(self):
+        return bytes(self.__nl)
+
+    def __repr__(self):
+        return repr(self.__nl)
+
+    def __format__(self, formatstr):
+        return self.__nl.__format__(formatstr)
+
+    def __hash__(self):
+        return hash(self.__nl)
+
+    def __bool__(self):
+        return bool(self.__nl)
+
+    def __dir__(self):
+        return dir(self.__nl)
+
+    def __delattr__(self, name):
+        return delattr(self.__nl, name)
+
+    def __len__(self):
+        return len(self.__nl)
+
+    def __getitem__(self, key):
+        return self.__nl[key]
+
+    def __setitem__(self, key, value):
+        self.__nl[key] = value
+
+    def __delitem__(self, key):
+        del self.__nl[key]
+
+    def __iter__(self):
+        return iter(self.__nl)
+
+    def __reversed__(self):
+        return reversed(self.__nl)
+
+    def __contains__(self, item):
+        return item in self.__nl
+
+    def __missing__(self, key):
+        return self.__nl.__missing__(key)
+
+    def __instancecheck__(self, instance):
+        return isinstance(self.__nl, instance)
+
+    def __call__(self, *args, **kwargs):
+        return self.__nl(*args, **kwargs)
+
+    def __enter__(self):
+        return self.__nl.__enter__()
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        return self.__nl.__exit__(exc_type, exc_value, exc_tb)
+
+    def __get__(self, instance, owner):
+        return self.__nl.__get__(instance, owner)
+
+    def __set__(self, instance, value):
+        return self.__nl.__set__(instance, value)
+
+    def __delete__(self, instance):
+        return self.__nl.__delete__(instance)
+
+    def __prepare__(self, name, bases):
+        return self.__nl.__prepare__(name, bases)
+
+    def __next__(self):
+        return next(self.__nl)
+
+    # PY2 support:
+    if PY2:
+        __nonzero__ = __bool__
+        # I can probably leave this; however, this is not the py2 convention.
+        del __bool__
+
+        def __coerce__(self, other):
+            return self.__nl.__coerce__(other)
+
+    @staticmethod
+    def reassign(nl, val):
+        _set_nl(nl, val)
+        if type(val) is not type(nl)._wrapped_ref():
+            _set_class(nl, _proxy_type(type(val)))
+
+
+# Access the slots directly because `NonLocal` forwards `__setattr__` and
+# shadows `__class__`.
+_get_nl = operator.attrgetter(_nlname)
+_set_nl = NonLocal.__dict__[_nlname].__set__
+_set_class = object.__dict__['__class__'].__set__
+
+# {wrapped type: proxy type}, the proxy types are dropped with the types they
+# wrap.
+_proxy_types = WeakKeyDictionary()
+
+
+def _array(self, *args, **kwargs):
+    return _get_nl(self).__array__(*args, **kwargs)
+
+
+def _buffer(self, flags):
+    return _get_nl(self).__buffer__(flags)
+
+
+# Protocols that are forwarded only by the proxies of types that implement
+# them. This lets numpy and `memoryview` (Python 3.12+) use the wrapped
+# buffer without a copy, while proxies for other types do not claim to
+# support them.
+_passthrough = {
+    '__array__': _array,
+    '__buffer__': _buffer,
+}
+
+
+def _proxy_type(tp):
+    """
+    Returns the subclass of `NonLocal` used to wrap values of type `tp`.
+
+    The subclass has a property for each public attribute of `tp` that reads
+    the attribute from the wrapped value with an `attrgetter`, so looking
+    these up does not run any python code. Other attributes fall back to
+    `NonLocal.__getattr__`.
+    """
+    try:
+        return _proxy_types[tp]
+    except KeyError:
+        pass
+
+    dict_ = {'__slots__': (), '_wrapped_ref': ref(tp)}
+    for name in dir(tp):
+        if (name.startswith('__') and name.endswith('__') or
+                hasattr(NonLocal, name)):
+            continue
+        dict_[name] = property(operator.attrgetter(_nlname + '.' + name))
+
+    for name, f in items(_passthrough):
+        if hasattr(tp, name):
+            dict_[name] = f
+
+    proxy = type(NonLocal)(NonLocal.__name__, (NonLocal,), dict_)
+    return _proxy_types.setdefault(tp, proxy)
+
+
+__all__ = [
+    'NonLocal',
+]
@@ -0,0 +1,352 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compose stages that work on iterables into one lazy pipeline, and cache
+the results of individual stages.
+"""
+from collections import OrderedDict, namedtuple
+from functools import partial
+from itertools import chain
+from types import FunctionType
+
+from metautils.box import box
+from metautils.compat import (
+    PY2,
+    Lock,
+    _composed_doc,
+    compose,
+    items,
+    perf_counter,
+)
+
+if PY2:
+    from itertools import ifilter as filter, imap as map  # noqa
+
+
+# `inspect.CO_GENERATOR`, which is not imported because `inspect` is slow
+# to import.
+_CO_GENERATOR = 0x20
+
+
+class mapping(box):
+    """
+    Marks a stage that is called on each item.
+
+    Plain functions are treated as mapping stages already; this is only
+    needed for callables that would otherwise be taken for another kind of
+    stage.
+    """
+    __slots__ = box.__slots__
+
+
+class filtering(box):
+    """
+    Marks a predicate stage that keeps the items it returns true for.
+    """
+    __slots__ = box.__slots__
+
+
+class expanding(box):
+    """
+    Marks a stage that is called on each item and returns an iterable of
+    items to pass on in its place.
+    """
+    __slots__ = box.__slots__
+
+
+class streaming(box):
+    """
+    Marks a stage that takes the whole iterable and returns an iterator.
+
+    Generator functions are treated as streaming stages already; this is
+    needed for other callables that consume an iterable.
+    """
+    __slots__ = box.__slots__
+
+
+def _is_generator(f):
+    code = getattr(f, '__code__', None)
+    return code is not None and bool(code.co_flags & _CO_GENERATOR)
+
+
+def _stages(fs):
+    """
+    Flatten the stages of any pipelines in `fs`.
+    """
+    for f in fs:
+        if isinstance(f, FunctionType) and '_streamed' in f.__dict__:
+            for stage in f._streamed:
+                yield stage
+        else:
+            yield f
+
+
+def _kind(f):
+    """
+    Returns the kind of a stage and the function that implements it.
+    """
+    if isinstance(f, box):
+        return type(f), f.unboxed
+    if _is_generator(f):
+        return streaming, f
+    return mapping, f
+
+
+def _expand(f):
+    return lambda it: chain.from_iterable(map(f, it))
+
+
+def _fused(maps):
+    """
+    The function that applies the mapping stages `maps`, given in the order
+    they are applied. This is the composition's function rather than the
+    `Composed` object so that `map` calls it without the extra dispatch.
+    """
+    return compose(*reversed(maps)).__call__
+
+
+def _steps(fs):
+    """
+    The functions that turn an iterator into the next stage's iterator, in
+    the order they are applied. Consecutive mapping stages are fused into a
+    single `map` over their composition.
+    """
+    steps = []
+    maps = []
+    for f in reversed(fs):
+        kind, f = _kind(f)
+        if kind is mapping:
+            maps.append(f)
+            continue
+
+        if maps:
+            steps.append(partial(map, _fused(maps)))
+            maps = []
+
+        if kind is filtering:
+            steps.append(partial(filter, f))
+        elif kind is expanding:
+            steps.append(_expand(f))
+        else:
+            steps.append(f)
+
+    if maps:
+        steps.append(partial(map, _fused(maps)))
+    return tuple(steps)
+
+
+def stream(*fs):
+    """
+    Compose stages into a function that lazily runs an iterable through
+    them, applying the stages from last to first like `compose`:
+
+    stream(f, g, h) = lambda n: f(g(h(n)))
+
+    where each stage is applied to the whole stream of items. Generator
+    functions, and stages marked with `streaming`, take the iterable from
+    the stage before them. Other functions are called on each item, as if
+    marked with `mapping`. Stages marked with `filtering` and `expanding`
+    drop and expand items.
+
+    No intermediate lists are built, so memory use does not grow with the
+    input. Consecutive mapping stages are fused into one `map` over their
+    `compose`. Pipelines passed to `stream` are flattened into their
+    stages, and the pipeline is named after its stages like `compose`.
+    """
+    fs = tuple(_stages(fs))
+    steps = _steps(fs)
+
+    if not steps:
+        def pipeline(n):
+            return iter(n)
+    elif len(steps) == 1:
+        step, = steps
+
+        def pipeline(n):
+            return step(n)
+    else:
+        def pipeline(n):
+            for step in steps:
+                n = step(n)
+            return n
+
+    pipeline._streamed = fs
+
+    names = [f.unboxed if isinstance(f, box) else f for f in fs]
+    try:
+        pipeline.__doc__ = 'lambda n: ' + _composed_doc(names)
+    except AttributeError:
+        pass
+    else:
+        pipeline.__name__ = '_of_'.join(f.__name__ for f in names)
+
+    return pipeline
+
+
+StageCacheInfo = namedtuple(
+    'StageCacheInfo',
+    'hits misses evictions size maxsize ttl',
+)
+
+_missing = object()
+
+
+class cached(object):
+    """
+    A stage of `compose` or `stream` that caches its results.
+
+    Each cached stage has its own cache, so a pure, expensive stage can be
+    cached without caching the stages around it.
+
+    Parameters
+    ----------
+    f : callable
+        The stage. This is called with one hashable argument.
+    maxsize : int, optional
+        The number of results to keep, dropping the least recently used
+        first. If this is `None` the size is not bounded.
+    ttl : float, optional
+        The number of seconds to keep each result for. If this is `None`
+        results do not expire. Expired results are dropped as new results
+        are added, so without a `maxsize` the cache only holds the results
+        added in the last `ttl` seconds.
+
+    Notes
+    -----
+    Calls with unhashable arguments are not cached. Pickling a cached stage
+    pickles `f` and the limits but not the results.
+    """
+    __slots__ = (
+        '_f',
+        'maxsize',
+        'ttl',
+        '_results',
+        '_lock',
+        'hits',
+        'misses',
+        'evictions',
+    )
+
+    def __init__(self, f, maxsize=128, ttl=None):
+        self._f = f
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # {n: (result, expires)}
+        self._results = OrderedDict()
+        self._lock = Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def __wrapped__(self):
+        return self._f
+
+    @property
+    def __name__(self):
+        return self._f.__name__
+
+    def __call__(self, n):
+        results = self._results
+        try:
+            with self._lock:
+                result, expires = results.get(n, (_missing, None))
+                if result is not _missing:
+                    if expires is None or expires > perf_counter():
+                        if self.maxsize is not None:
+                            # Mark the result as the most recently used.
+                            results[n] = results.pop(n)
+                        self.hits += 1
+                        return result
+                    del results[n]
+                    self.evictions += 1
+        except TypeError:
+            # `n` is not hashable.
+            return self._f(n)
+
+        result = self._f(n)
+        ttl = self.ttl
+        with self._lock:
+            self.misses += 1
+            if ttl is None:
+                results[n] = result, None
+            else:
+                now = perf_counter()
+                self._expire(now)
+                results[n] = result, now + ttl
+            if self.maxsize is not None and len(results) > self.maxsize:
+                results.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def _expire(self, now):
+        """
+        Drop the expired results from the least recently used end, so
+        results that are never requested again do not pile up.
+
+        Without a `maxsize`, results are kept in the order they were added,
+        which is the order they expire in, so this drops all of them.
+        """
+        results = self._results
+        evicted = 0
+        for n, (_, expires) in items(results):
+            if expires > now:
+                break
+            evicted += 1
+
+        for _ in range(evicted):
+            results.popitem(last=False)
+        self.evictions += evicted
+
+    def cache_info(self):
+        """
+        Returns the statistics of this stage's cache as a `StageCacheInfo`.
+        """
+        return StageCacheInfo(
+            self.hits,
+            self.misses,
+            self.evictions,
+            len(self._results),
+            self.maxsize,
+            self.ttl,
+        )
+
+    def cache_clear(self):
+        """
+        Remove all of the results and reset the statistics.
+        """
+        with self._lock:
+            self._results.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __reduce__(self):
+        return type(self), (self._f, self.maxsize, self.ttl)
+
+    def __repr__(self):
+        return '<{cls}: {f!r}, maxsize={maxsize}, ttl={ttl}>'.format(
+            cls=type(self).__name__,
+            f=self._f,
+            maxsize=self.maxsize,
+            ttl=self.ttl,
+        )
+
+
+__all__ = [
+    'StageCacheInfo',
+    'cached',
+    'expanding',
+    'filtering',
+    'mapping',
+    'stream',
+    'streaming',
+]
@@ -0,0 +1,182 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Resolve metaclass conflicts between bases.
+"""
+from weakref import WeakValueDictionary
+
+from metautils.template import origin
+
+
+# {(metaclass, type(base), ...): combined metaclass}
+_resolved = WeakValueDictionary()
+
+
+def _winner(metas):
+    """
+    Returns the metaclass in `metas` that is a subclass of all of the
+    others, or `None` if there is a conflict. This is how python picks the
+    metaclass of a class statement.
+    """
+    winner = metas[0]
+    for meta in metas[1:]:
+        if issubclass(winner, meta):
+            continue
+        if issubclass(meta, winner):
+            winner = meta
+            continue
+        return None
+    return winner
+
+
+def _unwind(meta):
+    """
+    Split a metaclass into the templates that built it and the metaclass
+    the innermost template was applied to.
+
+    Returns
+    -------
+    layers : list[(TemplateBase, bool)]
+        The templates and `adjust_name` arguments from the outermost to
+        the innermost.
+    root : type
+        The metaclass that was not built by a template.
+    """
+    layers = []
+    while True:
+        built = origin(meta)
+        if built is None:
+            return layers, meta
+        template, meta, adjust_name = built
+        layers.append((template, adjust_name))
+
+
+def _combine(meta, other):
+    """
+    Returns a metaclass that is a subclass of both `meta` and `other`.
+
+    If `meta` was built by templates on top of a base that `other`
+    subclasses, the templates are applied to `other` so that their
+    `templated` methods call into `other`'s instead of skipping it. This is
+    then mixed with `meta` itself so that the result is still a subclass
+    of `meta`.
+    """
+    layers, root = _unwind(meta)
+    if not layers or not issubclass(other, root):
+        return type(meta.__name__ + other.__name__, (meta, other), {})
+
+    combined = other
+    for template, adjust_name in reversed(layers):
+        combined = template(combined, adjust_name)
+
+    if issubclass(combined, meta):
+        return combined
+    return type(combined.__name__, (combined, meta), {})
+
+
+def resolve_metaclass(bases, metaclass=type):
+    """
+    Find the metaclass for a class with `bases`, combining the metaclasses
+    of the bases when they conflict.
+
+    Metaclasses built by templates are combined by applying the templates
+    to the other metaclasses, so every template's `templated` methods run.
+    Other metaclasses are combined by subclassing them all. Combined
+    metaclasses are memoized on the metaclasses of the bases, so resolving
+    the same conflict again is a single lookup, for as long as the
+    combined metaclass is alive.
+
+    Parameters
+    ----------
+    bases : iterable[type]
+        The bases of the class.
+    metaclass : type, optional
+        The explicitly requested metaclass.
+
+    Returns
+    -------
+    metaclass : type
+        A metaclass that is a subclass of `metaclass` and the metaclass of
+        every base.
+
+    Raises
+    ------
+    TypeError
+        Raised when the metaclasses cannot be combined, for example because
+        they have incompatible layouts.
+    """
+    key = (metaclass,) + tuple(map(type, bases))
+    try:
+        return _resolved[key]
+    except KeyError:
+        pass
+
+    winner = _winner(key)
+    if winner is not None:
+        return winner
+
+    unique = []
+    for meta in key:
+        if meta not in unique:
+            unique.append(meta)
+
+    # Only the most derived metaclasses need to be combined.
+    metas = [
+        meta for meta in unique
+        if not any(
+            other is not meta and issubclass(other, meta)
+            for other in unique
+        )
+    ]
+
+    combined = metas[-1]
+    for meta in reversed(metas[:-1]):
+        combined = _combine(meta, combined)
+
+    return _resolved.setdefault(key, combined)
+
+
+def new_class(name, bases=(), dict_=None, **kwargs):
+    """
+    Create a class, resolving any metaclass conflict between the bases
+    with `resolve_metaclass`.
+
+    Parameters
+    ----------
+    name : str
+        The name of the class.
+    bases : iterable[type], optional
+        The bases of the class.
+    dict_ : dict, optional
+        The namespace of the class.
+    metaclass : type, optional
+        The explicitly requested metaclass.
+    **kwargs
+        Passed to the metaclass.
+
+    Returns
+    -------
+    cls : type
+        The new class.
+    """
+    bases = tuple(bases)
+    metaclass = resolve_metaclass(bases, kwargs.pop('metaclass', type))
+    return metaclass(name, bases, dict(dict_ or {}), **kwargs)
+
+
+__all__ = [
+    'new_class',
+    'resolve_metaclass',
+]
@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from metautils import T, templated
+from metautils.compat import Lock, get_ident
 
 
 def _singleton_new(cls, *args, **kwargs):
@@ -42,3 +43,137 @@ class Singleton(T):
         # Prevent another instance from being made.
         cls.__new__ = _singleton_new
         return inst
+
+
+# Attributes that a lazy singleton proxy must not forward to the instance.
+_proxy_own = frozenset({
+    '__class__',
+    '__delattr__',
+    '__dict__',
+    '__dir__',
+    '__doc__',
+    '__getattr__',
+    '__getattribute__',
+    '__init__',
+    '__init_subclass__',
+    '__module__',
+    '__new__',
+    '__reduce__',
+    '__reduce_ex__',
+    '__setattr__',
+    '__slots__',
+    '__subclasshook__',
+    '__weakref__',
+})
+
+
+_unset = object()
+
+
+class _LazyInstance(object):
+    """
+    A proxy for the instance of a `LazySingleton` that constructs the
+    instance the first time it is used.
+    """
+    __slots__ = ('_cls', '_kwargs', '_lock', '_instance', '_builder')
+
+    def __init__(self, cls, kwargs):
+        _set = object.__setattr__
+        _set(self, '_cls', cls)
+        _set(self, '_kwargs', kwargs)
+        _set(self, '_lock', Lock())
+        _set(self, '_instance', _unset)
+        # The thread constructing the instance.
+        _set(self, '_builder', None)
+
+    def _resolve(self):
+        """
+        Returns the instance, constructing it if needed.
+        """
+        inst = self._instance
+        if inst is not _unset:
+            return inst
+
+        if self._builder == get_ident():
+            raise RuntimeError(
+                "'{0}' was used while its instance was being"
+                " constructed".format(self._cls.__name__),
+            )
+
+        with self._lock:
+            inst = self._instance
+            if inst is _unset:
+                cls = self._cls
+                object.__setattr__(self, '_builder', get_ident())
+                try:
+                    inst = cls(**self._kwargs)
+                finally:
+                    object.__setattr__(self, '_builder', None)
+                # Prevent another instance from being made.
+                cls.__new__ = _singleton_new
+                object.__setattr__(self, '_instance', inst)
+            return inst
+
+    @property
+    def __class__(self):
+        return type(self._resolve())
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._resolve(), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self._resolve(), attr)
+
+    def __dir__(self):
+        return dir(self._resolve())
+
+
+def _forward(name):
+    def method(self, *args, **kwargs):
+        return getattr(self._resolve(), name)(*args, **kwargs)
+
+    method.__name__ = name
+    return method
+
+
+def _lazy_instance(cls, kwargs):
+    """
+    Create the proxy for the lazy singleton instance of `cls`.
+
+    Special methods are looked up on the type, so the proxy's type forwards
+    each special method that `cls` overrides from `object`.
+    """
+    dict_ = {'__slots__': ()}
+    for name in dir(cls):
+        if (not (name.startswith('__') and name.endswith('__')) or
+                name in _proxy_own):
+            continue
+
+        attr = getattr(cls, name)
+        if callable(attr) and attr is not getattr(object, name, None):
+            dict_[name] = _forward(name)
+
+    proxy = type(cls.__name__, (_LazyInstance,), dict_)
+    return proxy(cls, kwargs)
+
+
+class LazySingleton(T):
+    """
+    Like `Singleton`, except that the instance is not constructed until it
+    is first used.
+
+    The class statement creates a proxy. The first attribute access, call,
+    or other operation on the proxy constructs the instance; after that the
+    proxy forwards everything to the instance. The instance is constructed
+    exactly once, even when it is first used from many threads at the same
+    time. Using the proxy from the class's own `__init__` raises a
+    `RuntimeError`.
+    """
+    @templated
+    def __new__(mcls, name, bases, dict_, T_, **kwargs):
+        dict_['__name__'] = name
+        cls = T_.__new__(mcls, name, bases, dict_)
+        return _lazy_instance(cls, kwargs)
@@ -12,18 +12,725 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from functools import wraps
-from textwrap import dedent
+from collections import OrderedDict
+from functools import partial, wraps
+import gc
+from importlib import import_module
+from types import FunctionType
+from weakref import WeakKeyDictionary, WeakSet, ref
 
 from metautils.box import methodbox
-from metautils.compat import compose, items, lru_cache
+from metautils.cache import InstantiationCache
+from metautils.compat import PY3, compose, items, perf_counter
+from metautils.hooks import (
+    DispatchEvent,
+    InstantiationEvent,
+    _dispatch_hooks,
+    _instantiation_hooks,
+    _notify,
+)
+
+
+def _rename_code(wrapper, f):
+    """
+    Give the code of `wrapper` the name of `f` so that profilers, which
+    name frames after the code, report the wrapped function instead of the
+    wrapper.
+    """
+    code = wrapper.__code__
+    name = getattr(f, '__name__', None)
+    if name is None or not hasattr(code, 'replace'):
+        # `code.replace` requires Python 3.8.
+        return wrapper
+
+    kwargs = {'co_name': name}
+    if hasattr(code, 'co_qualname'):
+        kwargs['co_qualname'] = getattr(f, '__qualname__', name)
+    wrapper.__code__ = code.replace(**kwargs)
+    return wrapper
+
+
+def _wrap_templated(f, T_):
+    """
+    Close over `T_` with a generic wrapper that passes it to `f` by keyword.
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        return f(*args, T_=T_, **kwargs)
+
+    return _rename_code(wrapper, f)
+
+
+def _observe_dispatch(template, name, f, T_):
+    """
+    Wrap a `templated` method that has had `T_` bound so that each call
+    is reported to the dispatch hooks. The classes outlive the hooks in the
+    instantiation cache, so once no hooks are registered this only checks
+    for them before calling `f`.
+    """
+    @wraps(f)
+    def observed(*args, **kwargs):
+        if not _dispatch_hooks:
+            return f(*args, **kwargs)
+
+        start = perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            _notify(
+                _dispatch_hooks,
+                DispatchEvent(template, name, T_, perf_counter() - start),
+            )
+
+    return _rename_code(observed, f)
+
+
+def _observe_instantiation(template, cache, plan, base, adjust_name):
+    """
+    The implementation of `Template.__call__` while there are instantiation
+    hooks.
+    """
+    timings = []
+
+    def build(base, adjust_name):
+        return plan.build(base, adjust_name, timings)
+
+    if cache is None:
+        cls = build(base, adjust_name)
+    else:
+        cls = cache.get_or_build(base, bool(adjust_name), build)
+
+    if timings:
+        preprocess_time, build_time, decorator_times = timings
+        cache_hit = False
+    else:
+        # The class was cached or built by another thread.
+        preprocess_time = build_time = 0.0
+        decorator_times = ()
+        cache_hit = True
+
+    _notify(_instantiation_hooks, InstantiationEvent(
+        template,
+        base,
+        bool(adjust_name),
+        cls,
+        cache_hit,
+        preprocess_time,
+        build_time,
+        decorator_times,
+    ))
+    return cls
+
+
+def _bind_templated(f, T_):
+    """
+    Bind `T_` into `f` by making a copy of the function where `T_` is a
+    keyword only argument that defaults to the template argument.
+
+    The copy runs the same bytecode as `f`, so calling it does not add a
+    frame or build any argument tuples or dicts. When `T_` is the last
+    positional argument, the copy's code object is rebuilt with `T_` as
+    its first keyword only argument, so an extra positional argument is a
+    `TypeError` instead of replacing the template argument. If `T_` is
+    neither keyword only nor the last positional argument, or `f` is not a
+    python function, this falls back to `_wrap_templated`.
+    """
+    if not isinstance(f, FunctionType):
+        return _wrap_templated(f, T_)
+
+    code = f.__code__
+    nargs = code.co_argcount
+    kwonly = code.co_varnames[
+        nargs:nargs + getattr(code, 'co_kwonlyargcount', 0)
+    ]
+    defaults = f.__defaults__ or ()
+    kwdefaults = getattr(f, '__kwdefaults__', None)
+
+    if 'T_' not in kwonly:
+        if (not nargs or
+                code.co_varnames[nargs - 1] != 'T_' or
+                getattr(code, 'co_posonlyargcount', 0) == nargs or
+                not hasattr(code, 'replace')):
+            return _wrap_templated(f, T_)
+
+        # Keyword only arguments directly follow the positional arguments
+        # in `co_varnames`, so moving the boundary makes `T_` the first.
+        code = code.replace(
+            co_argcount=nargs - 1,
+            co_kwonlyargcount=code.co_kwonlyargcount + 1,
+        )
+        # `defaults` line up with the last `len(defaults)` arguments.
+        defaults = defaults[:-1]
+
+    kwdefaults = dict(kwdefaults or {}, T_=T_)
+
+    bound = FunctionType(
+        code,
+        f.__globals__,
+        f.__name__,
+        defaults or None,
+        f.__closure__,
+    )
+    if PY3:
+        bound.__kwdefaults__ = kwdefaults
+        bound.__qualname__ = f.__qualname__
+
+    bound.__doc__ = f.__doc__
+    bound.__module__ = f.__module__
+    bound.__dict__.update(f.__dict__)
+    bound.__wrapped__ = f
+    return bound
+
+
+def _escape(s):
+    return s.replace('%', '%25').replace('.', '%2E')
+
+
+def _unescape(s):
+    return s.replace('%2E', '.').replace('%25', '%')
+
+
+_no_adjust_name = ';adjust_name=False'
+
+
+def _instance_name(name, base, adjust_name):
+    """
+    The name of the class called `name` built by a template from `base`.
+
+    This is used as the last part of the class's qualified name, which
+    pickle resolves with `getattr` on the template. The base is named by its
+    module and qualified name, with the dots escaped so that pickle treats
+    it as a single attribute.
+    """
+    return '{name}[{module}:{qualname}{adjust_name}]'.format(
+        name=name,
+        module=_escape(base.__module__),
+        qualname=_escape(getattr(base, '__qualname__', base.__name__)),
+        adjust_name='' if adjust_name else _no_adjust_name,
+    )
+
+
+def _parse_instance_name(attr):
+    """
+    The inverse of `_instance_name`.
+
+    Returns
+    -------
+    base : type
+        The base, imported by name.
+    adjust_name : bool
+        The `adjust_name` argument.
+
+    Raises
+    ------
+    ValueError
+        Raised when `attr` is not a name made by `_instance_name` or does
+        not name a class that can be imported.
+    """
+    if not attr.endswith(']'):
+        raise ValueError(attr)
+
+    _, sep, path = attr[:-1].partition('[')
+    if not sep:
+        raise ValueError(attr)
+
+    adjust_name = not path.endswith(_no_adjust_name)
+    if not adjust_name:
+        path = path[:-len(_no_adjust_name)]
+
+    module, sep, qualname = path.partition(':')
+    if not sep:
+        raise ValueError(attr)
+
+    try:
+        base = import_module(_unescape(module))
+        for part in _unescape(qualname).split('.'):
+            base = getattr(base, part)
+    except (ImportError, AttributeError):
+        raise ValueError(attr)
+
+    if not isinstance(base, type):
+        raise ValueError(attr)
+
+    return base, adjust_name
+
+
+# All of the live templates.
+_templates = WeakSet()
+
+
+def templates():
+    """
+    Returns a list of all of the live templates.
+    """
+    return list(_templates)
+
+
+# {cls: (template, ref(base), adjust_name, build_time)} for the classes
+# built by templates. The base is held weakly so that it may be collected
+# along with the class; while the class is alive it keeps the base alive.
+_origins = WeakKeyDictionary()
+
+
+def _record_origin(cls, template, base, adjust_name, build_time):
+    _origins[cls] = (
+        template,
+        InstantiationCache._base_ref(base),
+        bool(adjust_name),
+        build_time,
+    )
+
+
+def origin(cls):
+    """
+    Returns how a class was built by a template.
+
+    Returns
+    -------
+    origin : (TemplateBase, type, bool) or None
+        The template, the base it was called with and the `adjust_name`
+        argument, or `None` if `cls` was not built by a template.
+    """
+    try:
+        template, base, adjust_name, _ = _origins[cls]
+    except KeyError:
+        return None
+
+    if isinstance(base, ref):
+        base = base()
+    return template, base, adjust_name
+
+
+_dispatchers = {
+    'bind': _bind_templated,
+    'wrap': _wrap_templated,
+}
 
 
 class TemplateBase(object):
     """
     A marker for `Template` types.
     """
-    pass
+    @staticmethod
+    def __compose__(fs):
+        """
+        Hook for `compose` so that composing templates returns a
+        `TemplateChain`.
+        """
+        if all(isinstance(f, TemplateBase) for f in fs):
+            return TemplateChain(*fs)
+        return NotImplemented
+
+    def instantiate(self, *bases, **kwargs):
+        """
+        Explicitly instantiate this template for each of `bases`.
+
+        The classes are pinned in the instantiation cache so that they stay
+        alive until the cache is cleared, even if nothing else refers to
+        them. This moves building the classes out of the first call that
+        needs them.
+
+        Parameters
+        ----------
+        *bases
+            The bases to instantiate the template with.
+        adjust_name : bool, optional
+            The `adjust_name` argument to pass to the template.
+
+        Returns
+        -------
+        classes : list[type]
+            The classes, in the order of `bases`.
+        """
+        adjust_name = bool(kwargs.pop('adjust_name', True))
+        if kwargs:
+            raise TypeError(
+                'unexpected keyword arguments: {0}'.format(
+                    ', '.join(sorted(kwargs)),
+                ),
+            )
+
+        classes = [self(base, adjust_name) for base in bases]
+        cache = self._cache
+        if cache is not None:
+            # Builds are serialized per base by the cache, so only pinning
+            # the batch needs the cache's lock.
+            cache.pin(
+                (base, adjust_name, cls) for base, cls in zip(bases, classes)
+            )
+        return classes
+
+    def lazy(self, base=type, adjust_name=True):
+        """
+        Returns a `LazyInstantiation` that calls this template with `base`
+        and `adjust_name` the first time it is used.
+        """
+        return LazyInstantiation(self, base, adjust_name)
+
+
+# The attributes of `LazyInstantiation` instances that are read from the
+# class they stand for instead of from `LazyInstantiation`.
+_lazy_class_attributes = frozenset({'__doc__', '__module__'})
+
+
+class LazyInstantiation(object):
+    """
+    A placeholder for a class built by a template.
+
+    The class is not built until the placeholder is first called, has an
+    attribute looked up, is compared or hashed, is used in `isinstance` or
+    `issubclass`, or is subclassed. After that every operation is forwarded
+    to the class, and subclasses of the placeholder subclass the class
+    itself. The placeholder is equal to the class and hashes like it.
+
+    These are made with `Template.lazy`.
+    """
+    __slots__ = ('_template', '_base', '_adjust_name', '_cls')
+
+    def __init__(self, template, base, adjust_name):
+        object.__setattr__(self, '_template', template)
+        object.__setattr__(self, '_base', base)
+        object.__setattr__(self, '_adjust_name', adjust_name)
+        object.__setattr__(self, '_cls', None)
+
+    def _resolve(self):
+        """
+        Returns the class, building it if needed.
+        """
+        cls = self._cls
+        if cls is None:
+            # Concurrent calls are safe because the template's cache
+            # builds the class once.
+            cls = self._template(self._base, self._adjust_name)
+            object.__setattr__(self, '_cls', cls)
+        return cls
+
+    def __getattribute__(self, attr):
+        if attr in _lazy_class_attributes:
+            # These are found on `LazyInstantiation` itself, so they would
+            # not reach `__getattr__`.
+            return getattr(object.__getattribute__(self, '_resolve')(), attr)
+        return object.__getattribute__(self, attr)
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._resolve(), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self._resolve(), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __instancecheck__(self, instance):
+        return isinstance(instance, self._resolve())
+
+    def __subclasscheck__(self, subclass):
+        return issubclass(subclass, self._resolve())
+
+    def __mro_entries__(self, bases):
+        return self._resolve(),
+
+    def __eq__(self, other):
+        return self._resolve() == other
+
+    def __ne__(self, other):
+        return self._resolve() != other
+
+    def __hash__(self):
+        return hash(self._resolve())
+
+    def __reduce__(self):
+        return type(self), (self._template, self._base, self._adjust_name)
+
+    def __repr__(self):
+        if self._cls is not None:
+            return repr(self._cls)
+
+        return '<{cls}: {template}({base!r}, adjust_name={adjust})>'.format(
+            cls=type(self).__name__,
+            template=self._template,
+            base=self._base,
+            adjust=self._adjust_name,
+        )
+
+
+class _Plan(object):
+    """
+    How to instantiate a template, worked out once when the template is
+    defined.
+
+    Attributes
+    ----------
+    name, module, qualname : str
+        The names of the template.
+    bases : tuple
+        The bases from the template's class statement, excluding `T`.
+    namespace : dict
+        The body of the template's class statement.
+    templated : tuple[(str, callable)]
+        The names and unboxed functions of the `templated` members of
+        `namespace`.
+    preprocess : callable or None
+        The preprocess function.
+    decorators : tuple
+        The class decorators.
+    decorate : callable or None
+        The composition of `decorators`.
+    close : callable
+        The function that binds `T_` into a templated method.
+    slots : tuple[str] or None
+        The fields to give `__slots__` for, or `None` to leave `__slots__`
+        alone.
+    template : Template
+        The template this is the plan for.
+    """
+    __slots__ = (
+        'name',
+        'module',
+        'qualname',
+        'bases',
+        'namespace',
+        'templated',
+        'preprocess',
+        'decorators',
+        'decorate',
+        'close',
+        'slots',
+        'template',
+    )
+
+    def __init__(self,
+                 name,
+                 bases,
+                 dict_,
+                 preprocess,
+                 decorators,
+                 close,
+                 slots):
+        self.name = name
+        self.module = dict_.get('__module__')
+        self.qualname = dict_.get('__qualname__', name)
+        self.bases = bases
+        self.namespace = dict_
+        self.templated = _templated_members(dict_)
+        self.preprocess = preprocess
+        self.decorators = decorators
+        self.decorate = compose(*decorators) if decorators else None
+        self.close = close
+        self.slots = slots
+        self.template = None
+
+    def build(self, base, adjust_name, timings=None):
+        """
+        Constructs a new metaclass that is the composition of this
+        metaclass template and a base metaclass.
+
+        If `timings` is a list, the seconds spent in `preprocess`, the
+        seconds spent building the class and the decorators paired with the
+        seconds spent in each are appended to it.
+        """
+        start = perf_counter()
+        dict_cpy = self.namespace.copy()  # We could potentially mutate this.
+        inner_bases = (base,) + self.bases
+
+        if self.preprocess is None:
+            name_pp = self.name
+            members = self.templated
+            preprocess_time = 0.0
+        else:
+            if timings is not None:
+                preprocess_start = perf_counter()
+            # This function allows us to conditionally modify the class
+            # name, bases, or dict after we have recieved the base
+            # class. Think of this like a second meta layer.
+            name_pp, inner_bases, dict_cpy = self.preprocess(
+                self.name, inner_bases, dict_cpy
+            )
+            if timings is not None:
+                preprocess_time = perf_counter() - preprocess_start
+            # The preprocess function may have changed the members.
+            members = _templated_members(dict_cpy)
+
+        if self.slots is not None and '__slots__' not in dict_cpy:
+            dict_cpy['__slots__'] = _compact_slots(self.slots, inner_bases)
+
+        inner_base = inner_bases[0]
+        close = self.close
+        for k, f in members:
+            # The method needs the base class, so we close over it here.
+            dict_cpy[k] = close(f, inner_base)
+
+        if _dispatch_hooks:
+            for k, _ in members:
+                dict_cpy[k] = _observe_dispatch(
+                    self.template,
+                    k,
+                    dict_cpy[k],
+                    inner_base,
+                )
+
+        if adjust_name:
+            # We want to have the base's name prepended to ours.
+            name_pp = base.__name__ + name_pp
+
+        tp = type(name_pp, inner_bases, dict_cpy)
+        if timings is None:
+            if self.decorate is not None:
+                tp = self.decorate(tp)
+        else:
+            build_time = perf_counter() - start - preprocess_time
+            decorator_times = []
+            # `decorate` applies the decorators from right to left.
+            for decorator in reversed(self.decorators):
+                decorator_start = perf_counter()
+                tp = decorator(tp)
+                decorator_times.append(
+                    (decorator, perf_counter() - decorator_start),
+                )
+            timings.extend(
+                (preprocess_time, build_time, tuple(decorator_times)),
+            )
+
+        # Name the class as an attribute of the template so that it
+        # can be pickled by reference, see `Template.__getattr__`.
+        # This is Python 3 specific, but there is no need to make
+        # a check as this will not fail in Python 2, it is just
+        # not used.
+        tp.__module__ = self.module
+        tp.__qualname__ = '.'.join((
+            self.qualname,
+            _instance_name(name_pp, base, adjust_name),
+        ))
+        _record_origin(
+            tp,
+            self.template,
+            base,
+            adjust_name,
+            perf_counter() - start,
+        )
+        return tp
+
+
+def _as_slots(slots):
+    """
+    Normalize a `__slots__` value to a tuple.
+    """
+    if isinstance(slots, str):
+        return slots,
+    return tuple(slots)
+
+
+def _annotations(dict_):
+    """
+    Returns the annotations of a class body.
+
+    Since Python 3.14 the class body holds an `__annotate__` function
+    instead of `__annotations__`, which is called without evaluating names
+    that are not defined yet.
+    """
+    if '__annotations__' in dict_:
+        return dict_['__annotations__']
+
+    annotate = dict_.get('__annotate__')
+    if annotate is None:
+        return {}
+
+    import annotationlib
+    return annotationlib.call_annotate_function(
+        annotate,
+        annotationlib.Format.FORWARDREF,
+    )
+
+
+def _is_classvar(annotation):
+    """
+    Whether an annotation is `typing.ClassVar`, subscripted or not.
+    """
+    if isinstance(annotation, str):
+        # A string annotation, for example from `from __future__ import
+        # annotations`, so `typing.ClassVar` may be spelled any way.
+        name = annotation.partition('[')[0].strip()
+        return name.rpartition('.')[2] == 'ClassVar'
+
+    # `typing` is slow to import and only needed with annotations.
+    import typing
+    return (annotation is typing.ClassVar or
+            typing.get_origin(annotation) is typing.ClassVar)
+
+
+def _slot_fields(slots, dict_):
+    """
+    Work out the fields named by the `slots` template argument.
+
+    Parameters
+    ----------
+    slots : bool, str, iterable[str] or None
+        `True` to use the annotated names of the class body, except
+        `ClassVar` annotations, or the field names.
+    dict_ : dict
+        The body of the template's class statement.
+
+    Returns
+    -------
+    fields : tuple[str] or None
+        The fields, or `None` if `slots` is `None` or `False`.
+    """
+    if slots is None or slots is False:
+        return None
+
+    if '__slots__' in dict_:
+        raise TypeError(
+            'cannot pass slots to a template that defines __slots__',
+        )
+
+    if slots is True:
+        fields = tuple(
+            name
+            for name, annotation in items(_annotations(dict_))
+            if not _is_classvar(annotation)
+        )
+        if not fields:
+            raise TypeError(
+                'slots=True requires annotated instance attributes',
+            )
+    else:
+        fields = _as_slots(slots)
+
+    conflicts = sorted(field for field in fields if field in dict_)
+    if conflicts:
+        raise TypeError(
+            'slots conflict with class variables: {0}'.format(
+                ', '.join(conflicts),
+            ),
+        )
+
+    return fields
+
+
+def _compact_slots(fields, bases):
+    """
+    Returns the `__slots__` for a class with `bases` and the instance
+    attributes `fields`, leaving out the slots that the bases already have.
+    """
+    inherited = set()
+    for base in bases:
+        for cls in base.__mro__:
+            inherited.update(_as_slots(cls.__dict__.get('__slots__', ())))
+
+    return tuple(field for field in fields if field not in inherited)
+
+
+def _templated_members(dict_):
+    """
+    Returns the names and unboxed functions of the `templated` members of a
+    class body.
+    """
+    return tuple(
+        (k, v.unboxed) for k, v in items(dict_) if isinstance(v, templated)
+    )
 
 
 class _TemplateMeta(type):
@@ -37,7 +744,9 @@ class _TemplateMeta(type):
                 dict_,
                 preprocess=None,
                 decorators=(),
-                cachesize=None):
+                cachesize=None,
+                dispatch='bind',
+                slots=None):
 
         template_param = bases[0]
         if not isinstance(template_param, _TemplateMeta):
@@ -56,8 +765,33 @@ class _TemplateMeta(type):
                 **template_param._kwargs
             )
 
-        preprocess = preprocess or (lambda *a: a)
-        decorators = tuple(decorators)
+        try:
+            close = _dispatchers[dispatch]
+        except KeyError:
+            raise ValueError(
+                'dispatch must be one of {0}, got {1!r}'.format(
+                    sorted(_dispatchers),
+                    dispatch,
+                ),
+            )
+
+        if cachesize is None or cachesize >= 0:
+            cache = InstantiationCache(cachesize)
+        else:
+            cache = None
+
+        plan = _Plan(
+            name,
+            bases,
+            dict_,
+            preprocess,
+            tuple(decorators),
+            close,
+            _slot_fields(slots, dict_),
+        )
+        module = plan.module
+        template_qualname = plan.qualname
+        instantiate = plan.build
 
         class Template(TemplateBase):
             """
@@ -66,6 +800,9 @@ class _TemplateMeta(type):
             metaclass.
             """
             __slots__ = ()
+            __module__ = module
+            _plan = plan
+            _cache = cache
 
             def __call__(self, base=type, adjust_name=True):
                 """
@@ -74,46 +811,60 @@ class _TemplateMeta(type):
 
                 If `adjust_name` is truthy, the name of the base class will be
                 prepended with the name of the new class.
+
+                Unless the cache is disabled, calls with the same base and
+                `adjust_name` return the same class for as long as that class
+                is alive.
                 """
-                dict_cpy = dict_.copy()  # We could potentially mutate this.
-                inner_bases = (base,) + bases
-
-                # This function allows us to conditionally modify the class
-                # name, bases, or dict after we have recieved the base
-                # class. Think of this like a second meta layer.
-                name_pp, inner_bases, dict_cpy = preprocess(
-                    name, inner_bases, dict_cpy
-                )
+                if _instantiation_hooks:
+                    return _observe_instantiation(
+                        self,
+                        cache,
+                        plan,
+                        base,
+                        adjust_name,
+                    )
 
-                inner_base = inner_bases[0]
+                if cache is None:
+                    return instantiate(base, adjust_name)
 
-                for k, v in items(dict_cpy):
-                    if isinstance(v, templated):
-                        # The method needs the base class in a closure, so we
-                        # construct one here.
-                        def close_by_value(unboxed=v.unboxed):
-                            # This is the dumbest python scoping issue.
-                            @wraps(unboxed)
-                            def wrapper(*args, **kwargs):
-                                return unboxed(*args, T_=inner_base, **kwargs)
+                return cache.get_or_build(
+                    base,
+                    bool(adjust_name),
+                    instantiate,
+                )
 
-                            return wrapper
+            def cache_info(self):
+                """
+                Returns the statistics of the instantiation cache as a
+                `CacheInfo`, or `None` if the cache is disabled.
+                """
+                if cache is None:
+                    return None
+                return cache.info()
 
-                        dict_cpy[k] = close_by_value()
+            def cache_clear(self):
+                """
+                Clear the instantiation cache and its statistics.
+                """
+                if cache is not None:
+                    cache.clear()
 
-                if adjust_name:
-                    # We want to have the base's name prepended to ours.
-                    name_pp = base.__name__ + name_pp
+            def __getattr__(self, attr):
+                """
+                Resolve the name of a class built by this template, which
+                is how the classes are unpickled.
+                """
+                try:
+                    base, adjust_name = _parse_instance_name(attr)
+                except ValueError:
+                    raise AttributeError(attr)
 
-                tp = compose(*decorators)(type(name_pp, inner_bases, dict_cpy))
-                # This is Python 3 specific, but there is no need to make
-                # a check as this will not fail in Python 2, it is just
-                # not used.
-                tp.__qualname__ = name_pp
-                return tp
+                return self(base, adjust_name)
 
-            if cachesize is None or cachesize >= 0:
-                __call__ = lru_cache(cachesize)(__call__)
+            def __reduce__(self):
+                # Pickle the template by reference.
+                return template_qualname
 
             def __repr__(self):
                 return '<{cls}: {name} at 0x{id_}>'.format(
@@ -124,7 +875,371 @@ class _TemplateMeta(type):
 
             __str__ = __repr__
 
-        return Template()
+        template = plan.template = Template()
+        _templates.add(template)
+        return template
+
+
+# Attributes of `_FlatBase` instances that cannot be shadowed by the
+# instance dict.
+_flat_base_own = frozenset({'__class__', '__dict__', '__weakref__'})
+
+
+class _FlatBase(object):
+    """
+    The `T_` given to the `templated` methods of a layer of a flattened
+    `TemplateChain`.
+
+    This stands in for the class the layer would have been built on top of.
+    The members of the inner layers are stored in the instance dict, so
+    looking them up is as fast as an attribute lookup on a class. Anything
+    else is looked up on the base.
+    """
+    def __init__(self, base):
+        dict_ = self.__dict__
+        dict_['_FlatBase__base'] = base
+        # The instance dict shadows the attributes that `object` defines on
+        # this type, so fill those in from the base.
+        for name in dir(_FlatBase):
+            if name not in _flat_base_own:
+                try:
+                    dict_[name] = getattr(base, name)
+                except AttributeError:
+                    pass
+
+    def __getattr__(self, attr):
+        return getattr(self.__dict__['_FlatBase__base'], attr)
+
+    def __repr__(self):
+        return '<{cls}: {base!r}>'.format(
+            cls=type(self).__name__,
+            base=self.__dict__['_FlatBase__base'],
+        )
+
+
+def _class_get(value, cls):
+    """
+    Returns `value` as it would be looked up as an attribute of `cls`.
+    """
+    get = getattr(type(value), '__get__', None)
+    if get is None:
+        return value
+    return get(value, None, cls)
+
+
+# Names that the class statement adds to every namespace. These are not
+# members that could hide an inner template's members.
+_flat_bookkeeping = frozenset({
+    '__annotate__',
+    '__annotations__',
+    '__classcell__',
+    '__doc__',
+    '__firstlineno__',
+    '__module__',
+    '__qualname__',
+    '__slots__',
+    '__static_attributes__',
+})
+
+
+def _check_flattenable(templates):
+    """
+    Raise a `TypeError` if `templates` cannot be used in a flattened
+    `TemplateChain`.
+    """
+    defined = set()
+    for template in reversed(templates):
+        plan = getattr(template, '_plan', None)
+        if plan is None:
+            raise TypeError(
+                'cannot flatten {0!r}, it is not a class template'.format(
+                    template,
+                ),
+            )
+        if plan.preprocess is not None:
+            raise TypeError(
+                'cannot flatten {0!r}, it has a preprocess function'.format(
+                    template,
+                ),
+            )
+        if '__classcell__' in plan.namespace:
+            # Zero argument `super` would refer to the single flattened
+            # class and skip the inner templates.
+            raise TypeError(
+                'cannot flatten {0!r}, it uses super() or __class__'.format(
+                    template,
+                ),
+            )
+
+        templated = {k for k, _ in plan.templated}
+        members = set(plan.namespace) - _flat_bookkeeping
+        hidden = sorted((members - templated) & defined)
+        if hidden:
+            # Only `templated` methods can reach the members they override.
+            raise TypeError(
+                'cannot flatten {0!r}, it overrides {1} without'
+                ' templated'.format(template, ', '.join(hidden)),
+            )
+        defined |= members
+
+
+def _flatten(templates, base, adjust_name):
+    """
+    Build the single class that is equivalent to applying `templates` to
+    `base` from right to left.
+
+    The namespaces of the templates are merged from the innermost template
+    out, so outer members override inner ones like they would through the
+    MRO. Each template's `templated` methods are given a `_FlatBase` holding
+    the members of the templates inside it as `T_`, so the methods chain in
+    the same order without a class for each template.
+    """
+    plans = [template._plan for template in reversed(templates)]
+    namespace = {}
+    bases = [base]
+    slots = []
+    has_slots = False
+    cells = []
+    # The members defined so far and the `_FlatBase` objects to fill in once
+    # the class exists.
+    inner = {}
+    flat_bases = []
+
+    for plan in plans:
+        if inner:
+            T_ = _FlatBase(base)
+            flat_bases.append((T_, inner.copy()))
+        else:
+            # No members are shadowed yet so the base itself can be used.
+            T_ = base
+
+        dict_ = plan.namespace.copy()
+        dict_.pop('__qualname__', None)
+        cell = dict_.pop('__classcell__', None)
+        if cell is not None:
+            cells.append(cell)
+
+        layer_slots = dict_.pop('__slots__', plan.slots)
+        if layer_slots is not None:
+            has_slots = True
+            slots.extend(
+                slot for slot in _as_slots(layer_slots) if slot not in slots
+            )
+
+        close = plan.close
+        for k, f in plan.templated:
+            dict_[k] = close(f, T_)
+            if _dispatch_hooks:
+                dict_[k] = _observe_dispatch(plan.template, k, dict_[k], T_)
+
+        inner.update(dict_)
+        namespace.update(dict_)
+        bases.extend(b for b in plan.bases if b not in bases)
+
+    if has_slots:
+        namespace['__slots__'] = _compact_slots(slots, bases)
+
+    if adjust_name:
+        name = base.__name__ + ''.join(plan.name for plan in plans)
+    else:
+        name = plans[-1].name
+
+    tp = type(name, tuple(bases), namespace)
+    for T_, members in flat_bases:
+        T_.__dict__.update(
+            (k, _class_get(v, tp)) for k, v in items(members)
+        )
+    for cell in cells:
+        # This is what `type` does with a single `__classcell__`.
+        cell.cell_contents = tp
+
+    for plan in plans:
+        if plan.decorate is not None:
+            tp = plan.decorate(tp)
+
+    return tp
+
+
+class TemplateChain(TemplateBase):
+    """
+    A template that is the composition of other templates.
+
+    Calling the chain with a base applies the templates from right to left,
+    so `TemplateChain(m, n, p)(base)` is `m(n(p(base)))`. The chain has its
+    own instantiation cache keyed on the base so that resolving the full
+    chain for a base that has been seen before is a single lookup.
+    `compose` returns a `TemplateChain` when all of its arguments are
+    templates.
+
+    Parameters
+    ----------
+    *templates
+        The templates to compose. Chains are flattened into their
+        templates.
+    cachesize : int, optional
+        The cache size, with the same meaning as the `cachesize` template
+        argument.
+    flatten : bool, optional
+        Build a single class with the members of all of the templates
+        instead of a class for each template. The class has the same
+        members and its `templated` methods chain in the same order, but
+        its MRO is only one class deeper than the base's, which makes
+        attribute lookups cheaper and keeps fewer classes alive. Inside a
+        flattened chain, `T_` is only an attribute namespace, not a class,
+        so it cannot be used with `super` or `isinstance`. Templates with
+        a `preprocess` function or that use zero argument `super` or
+        `__class__` cannot be flattened, and a template may only override
+        a member of the templates inside it with a `templated` method. A
+        `TypeError` is raised for these. The classes cannot be pickled by
+        reference.
+    """
+    def __init__(self, *templates, **kwargs):
+        cachesize = kwargs.pop('cachesize', None)
+        flatten = kwargs.pop('flatten', False)
+        if kwargs:
+            raise TypeError(
+                'unexpected keyword arguments: {0}'.format(
+                    ', '.join(sorted(kwargs)),
+                ),
+            )
+
+        flat = []
+        for template in templates:
+            if isinstance(template, TemplateChain):
+                flat.extend(template.templates)
+            elif isinstance(template, TemplateBase):
+                flat.append(template)
+            else:
+                raise TypeError(
+                    'expected a template, got {0!r}'.format(template),
+                )
+
+        if flatten:
+            _check_flattenable(flat)
+
+        self.templates = tuple(flat)
+        self.flatten = flatten
+        self._cachesize = cachesize
+        if cachesize is None or cachesize >= 0:
+            self._cache = InstantiationCache(cachesize)
+        else:
+            self._cache = None
+        _templates.add(self)
+
+    def _instantiate(self, base, adjust_name):
+        if self.flatten:
+            start = perf_counter()
+            cls = _flatten(self.templates, base, adjust_name)
+            _record_origin(
+                cls,
+                self,
+                base,
+                adjust_name,
+                perf_counter() - start,
+            )
+            return cls
+
+        for template in reversed(self.templates):
+            base = template(base, adjust_name)
+        return base
+
+    def __call__(self, base=type, adjust_name=True):
+        """
+        Apply the templates to `base` from right to left.
+        """
+        if self._cache is None:
+            return self._instantiate(base, adjust_name)
+
+        return self._cache.get_or_build(
+            base,
+            bool(adjust_name),
+            self._instantiate,
+        )
+
+    def cache_info(self):
+        """
+        Returns the statistics of the instantiation cache as a `CacheInfo`,
+        or `None` if the cache is disabled.
+        """
+        if self._cache is None:
+            return None
+        return self._cache.info()
+
+    def cache_clear(self):
+        """
+        Clear the instantiation cache and its statistics.
+        """
+        if self._cache is not None:
+            self._cache.clear()
+
+    def __reduce__(self):
+        return (
+            partial(
+                type(self),
+                cachesize=self._cachesize,
+                flatten=self.flatten,
+            ),
+            self.templates,
+        )
+
+    def __repr__(self):
+        return '<{cls}: {templates}>'.format(
+            cls=type(self).__name__,
+            templates=', '.join(map(repr, self.templates)),
+        )
+
+    __str__ = __repr__
+
+
+def prewarm(pairs, adjust_name=True):
+    """
+    Explicitly instantiate templates ahead of time, see
+    `Template.instantiate`.
+
+    Parameters
+    ----------
+    pairs : iterable[(Template, type)]
+        The templates and the bases to instantiate them with.
+    adjust_name : bool, optional
+        The `adjust_name` argument to pass to the templates.
+
+    Returns
+    -------
+    classes : list[type]
+        The classes, in the order of `pairs`.
+    """
+    adjust_name = bool(adjust_name)
+    classes = []
+    # {cache: [(base, adjust_name, cls)]} so that each cache is locked once
+    # to pin all of its classes.
+    pins = OrderedDict()
+    for template, base in pairs:
+        cls = template(base, adjust_name)
+        classes.append(cls)
+        cache = template._cache
+        if cache is not None:
+            pins.setdefault(cache, []).append((base, adjust_name, cls))
+
+    for cache, entries in items(pins):
+        cache.pin(entries)
+    return classes
+
+
+def prefork():
+    """
+    Prepare the objects that exist now, such as the classes built by
+    `prewarm`, to be shared with processes forked after this is called.
+
+    This runs a full collection and then, on Python 3.7 and later, moves
+    every object into the garbage collector's permanent generation with
+    `gc.freeze`. The collector then never touches those objects in the
+    children, so their memory stays shared copy-on-write instead of being
+    copied into every worker.
+    """
+    gc.collect()
+    freeze = getattr(gc, 'freeze', None)
+    if freeze is not None:
+        freeze()
 
 
 class _TWithArgs(object):
@@ -149,74 +1264,107 @@ def T_new(cls, **kwargs):
     })
 
 
-# The template parameter. This uses `type.__new__` because we need a concrete
-# class here, not a template.
-T = type.__new__(_TemplateMeta, 'T', (object,), {
-    '__doc__': dedent(
-        """
-        A template parameter similar to c++ class templates.
+# This is written without indentation so that it does not need to be
+# dedented at import time.
+_T_doc = """
+A template parameter similar to c++ class templates.
 
-        Class templates are defined by 'subclassing' `T`.
-        For example:
+Class templates are defined by 'subclassing' `T`.
+For example:
 
-        >>> class MyTemplate(T):
-        ...    @templated
-        ...    def method(self, T_):
-        ...        print(T_, 'is the template argument')
+>>> class MyTemplate(T):
+...    @templated
+...    def method(self, T_):
+...        print(T_, 'is the template argument')
 
-        To construct instances of your templated class, call the
-        template with the class you want to subclass.
+To construct instances of your templated class, call the
+template with the class you want to subclass.
 
-        >>> NewClass = MyTemplate(MyBaseClass)
-        >>> NewClass.__base__ == MyBaseClass
-        True
-        >>> NewClass.__mro__ = (MyBaseClass,) + MyBaseClass.__mro__
-        True
+>>> NewClass = MyTemplate(MyBaseClass)
+>>> NewClass.__base__ == MyBaseClass
+True
+>>> NewClass.__mro__ = (MyBaseClass,) + MyBaseClass.__mro__
+True
 
-        The `templated` decorator will pass the templated argument to the
-        function implicitly allowing us to close over the base class.
+The `templated` decorator will pass the templated argument to the
+function implicitly allowing us to close over the base class.
 
-        >>> NewClass().method()
-        'MyBaseClass is the template argument'
+>>> NewClass().method()
+'MyBaseClass is the template argument'
 
-        Additional arguments can be passed to the template as keyword
-        arguments in the class statement, or as arguments to `T`.
+Additional arguments can be passed to the template as keyword
+arguments in the class statement, or as arguments to `T`.
 
-        >>> class Python3Style(T, decorators=(mydecorator,)):
-        ...     pass
+>>> class Python3Style(T, decorators=(mydecorator,)):
+...     pass
 
-        or in Python 2 without class arguments:
+or in Python 2 without class arguments:
 
-        >>> class Python2Style(T(decorators=(mydecorator,))):
-        ...     pass
+>>> class Python2Style(T(decorators=(mydecorator,))):
+...     pass
 
-        Python 2 style will work in Python 2 or 3, so it should be used
-        for cross compatible code; however, the Python 3 style looks
-        much better and should be used if no python 2 compatibility is
-        needed. In Python 3, passing arguments through the template
-        argument will override the arguments passed to the class by keyword.
+Python 2 style will work in Python 2 or 3, so it should be used
+for cross compatible code; however, the Python 3 style looks
+much better and should be used if no python 2 compatibility is
+needed. In Python 3, passing arguments through the template
+argument will override the arguments passed to the class by keyword.
 
-        The arguments may include:
+Classes built by a template are named as attributes of the
+template, for example `MyTemplate.MyBaseClassMyTemplate[...]`,
+where the brackets hold the import path of the base. If the
+template and the base can be imported, this lets pickle save the
+classes, and their instances, by reference and rebuild them
+through the template when they are loaded.
 
-        preprocess: A function that takes the name, bases, and dict_
-          of the class before it is generated and returns a new name,
-          bases, and dict_. This allows you to change any of these
-          class parameters before the class is constructed but after
-          the template argument has been passed. The template argument
-          will be `bases[0]`.
+The arguments may include:
 
-        decorators: An iterable of class decorators to apply to the
-          newly constructed class object.
+preprocess: A function that takes the name, bases, and dict_
+  of the class before it is generated and returns a new name,
+  bases, and dict_. This allows you to change any of these
+  class parameters before the class is constructed but after
+  the template argument has been passed. The template argument
+  will be `bases[0]`.
 
-        cachesize: Because templates are normally used to construct
-          classes dynamically, we frequently will pass the same base
-          classes in multiple places. To make this more efficient,
-          we can `lru_cache` the class factory. This is the argument
-          that will be the `lru_cache`'s cachesize. If this is less
-          than 0, no cache will be used. If this is `None`, then there
-          will be no upper bounds on the cache.
-        """,
-    ),
+decorators: An iterable of class decorators to apply to the
+  newly constructed class object.
+
+cachesize: Because templates are normally used to construct
+  classes dynamically, we frequently will pass the same base
+  classes in multiple places. To make this more efficient,
+  the class factory is cached. The cache only holds weak
+  references to the bases and the classes it builds, so while
+  a class is alive the template will return it for the same
+  arguments, and once it is unused it may be collected.
+  `cachesize` is the number of most recently used classes that
+  are also held strongly, keeping them alive. If this is `None`,
+  only weak references are held. If this is less than 0, no
+  cache will be used. With the cache, threads that instantiate
+  the template with the same arguments at the same time wait
+  for a single build and receive the same class.
+
+dispatch: How `templated` methods receive `T_`. With 'bind', the
+  default, each method is copied with `T_` as a keyword only argument
+  that defaults to the template argument, so calling it costs the same
+  as calling the original function. This requires that `T_` is either
+  keyword only or the last positional argument; otherwise the method
+  falls back to 'wrap'. With 'wrap', each method is wrapped in a
+  function that passes `T_` by keyword.
+
+slots: Give the classes a `__slots__` so that their instances do
+  not need a `__dict__`. This is either an iterable of the instance
+  attribute names, or `True` to use the names annotated in the
+  class body, except `ClassVar` annotations, which must annotate at
+  least one name. When the template is
+  instantiated, the slots that the base already has are left out.
+  The template may not also define `__slots__` or class variables
+  with the same names.
+"""
+
+
+# The template parameter. This uses `type.__new__` because we need a concrete
+# class here, not a template.
+T = type.__new__(_TemplateMeta, 'T', (object,), {
+    '__doc__': _T_doc,
     '__new__': T_new,
     '__slots__': (),
 })
@@ -0,0 +1,73 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import count, islice
+from unittest import TestCase
+
+from metautils import batch, compose
+
+
+def inc(n):
+    return n + 1
+
+
+def double(n):
+    return n * 2
+
+
+class BatchTestCase(TestCase):
+    def test_serial(self):
+        f = compose(inc, double)
+        expected = [inc(double(n)) for n in range(10)]
+        self.assertEqual(batch.map(f, range(10)), expected)
+        self.assertEqual(list(batch.imap(f, range(10))), expected)
+        self.assertEqual(
+            list(batch.chunked(f, range(10), chunksize=4)),
+            [expected[:4], expected[4:8], expected[8:]],
+        )
+
+    def test_methods(self):
+        f = compose(inc, double)
+        self.assertEqual(f.map(range(3)), [1, 3, 5])
+        self.assertEqual(list(f.imap(range(3))), [1, 3, 5])
+        self.assertEqual(list(f.chunked(range(3), 2)), [[1, 3], [5]])
+
+    def test_threads(self):
+        f = compose(inc, double)
+        expected = [inc(double(n)) for n in range(1000)]
+        with ThreadPoolExecutor(4) as executor:
+            self.assertEqual(f.map(range(1000), executor=executor), expected)
+            self.assertEqual(
+                f.map(iter(range(1000)), chunksize=7, executor=executor),
+                expected,
+            )
+            # Only a bounded number of chunks are submitted ahead, so this
+            # works on an infinite iterator.
+            self.assertEqual(
+                list(islice(f.imap(count(), executor=executor), 5)),
+                expected[:5],
+            )
+            self.assertEqual(
+                batch.map(inc, [], executor=executor),
+                [],
+            )
+
+    def test_processes(self):
+        f = compose(inc, double)
+        with ProcessPoolExecutor(2) as executor:
+            self.assertEqual(
+                f.map(range(100), executor=executor),
+                [inc(double(n)) for n in range(100)],
+            )
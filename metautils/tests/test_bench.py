@@ -0,0 +1,73 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from contextlib import redirect_stdout
+from io import StringIO
+import json
+from unittest import TestCase
+
+from metautils.bench import benchmarks, dump, run
+from metautils.bench.__main__ import main
+
+
+class BenchTestCase(TestCase):
+    def test_runs_all_benchmarks(self):
+        """
+        Tests that every benchmark runs and produces a json report.
+        """
+        report = run(number=1, repeat=1)
+        self.assertEqual(
+            [r['name'] for r in report['results']],
+            benchmarks(),
+        )
+        out = StringIO()
+        dump(report, out)
+        self.assertEqual(json.loads(out.getvalue()), report)
+
+    def test_import_time_selection(self):
+        """
+        Tests that the import time is only measured when it is selected.
+        """
+        report = run(['compose_call_1'], number=1, repeat=1)
+        self.assertIsNone(report['import_time_us'])
+
+        report = run(['import_time'], number=1, repeat=1)
+        self.assertGreater(report['import_time_us'], 0)
+        self.assertEqual(report['results'], [])
+
+    def test_main_filter(self):
+        """
+        Tests that the command line runner only runs and lists the
+        benchmarks that match the patterns.
+        """
+        out = StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(
+                main(['compose_call_[15]', '-n', '1', '-r', '1']),
+                0,
+            )
+        report = json.loads(out.getvalue())
+        self.assertEqual(
+            [r['name'] for r in report['results']],
+            ['compose_call_1', 'compose_call_5'],
+        )
+        self.assertIsNone(report['import_time_us'])
+
+        out = StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(main(['--list', 'compose_*']), 0)
+        self.assertEqual(
+            out.getvalue().split(),
+            [name for name in benchmarks() if name.startswith('compose_')],
+        )
@@ -0,0 +1,104 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pickle
+from unittest import TestCase
+
+from metautils.compat import Composed, compose
+
+
+def f(n):
+    return n + 'f'
+
+
+def g(n):
+    return n + 'g'
+
+
+def h(n):
+    return n + 'h'
+
+
+class ComposeTestCase(TestCase):
+    def test_order(self):
+        """
+        Tests that functions are applied from right to left for each of
+        the specialized lengths.
+        """
+        fs = (f, g, h) * 3
+        for n in range(len(fs) + 1):
+            self.assertEqual(
+                compose(*fs[:n])(''),
+                ''.join(reversed([fn.__name__ for fn in fs[:n]])),
+            )
+
+    def test_name_and_doc(self):
+        composed = compose(f, g, h)
+        self.assertEqual(composed.__name__, 'f_of_g_of_h')
+        self.assertEqual(composed.__doc__, 'lambda n: f(g(h(n)))')
+
+    def test_flattens(self):
+        """
+        Tests that nested compositions are flattened into their stages.
+        """
+        composed = compose(compose(f, g), h, compose(g, compose(f)))
+        self.assertEqual(composed.stages, (f, g, h, g, f))
+        self.assertEqual(composed(''), 'fghgf')
+        self.assertEqual(composed.__name__, 'f_of_g_of_h_of_g_of_f')
+
+    def test_long(self):
+        """
+        Tests that long compositions do not hit the recursion or nesting
+        limits.
+        """
+        def inc(n):
+            return n + 1
+
+        self.assertEqual(compose(*(inc,) * 5000)(0), 5000)
+
+    def test_composed(self):
+        composed = compose(f, g)
+        self.assertIsInstance(composed, Composed)
+        self.assertEqual(composed.stages, (f, g))
+        self.assertIn('composition', Composed.__doc__)
+        self.assertEqual(repr(composed), '<Composed: f_of_g>')
+
+        unnamed = compose(f, lambda n: n, object())
+        self.assertEqual(unnamed.__name__, 'composed')
+        self.assertIsNone(unnamed.__doc__)
+
+    def test_equality(self):
+        self.assertEqual(compose(f, g), compose(f, g))
+        self.assertEqual(compose(f, g), compose(compose(f), g))
+        self.assertNotEqual(compose(f, g), compose(g, f))
+        self.assertEqual(len({compose(f, g), compose(f, g), compose(h)}), 2)
+
+    def test_pickle(self):
+        composed = compose(f, g, h)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            loaded = pickle.loads(pickle.dumps(composed, protocol))
+            self.assertEqual(loaded, composed)
+            self.assertEqual(loaded(''), 'hgf')
+            self.assertEqual(loaded.__name__, composed.__name__)
+
+    def test_method(self):
+        """
+        Tests that compositions bind like functions.
+        """
+        class C(object):
+            method = compose(repr, id)
+
+        inst = C()
+        self.assertEqual(inst.method(), repr(id(inst)))
+        self.assertIs(C.method, C.__dict__['method'])
@@ -0,0 +1,187 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import ast
+from importlib import import_module
+import os
+import shutil
+import sys
+import tempfile
+from unittest import TestCase, skipIf
+
+from metautils import T, templated
+from metautils.freeze import freeze, main
+from metautils.template import TemplateChain
+
+SCALE = 10
+
+
+class Base(object):
+    def method(self, a):
+        return ('base', a)
+
+
+def helper(a):
+    return a * SCALE
+
+
+def mark(cls):
+    cls.marked = True
+    return cls
+
+
+def _closure():
+    value = 'closure'
+
+    def method(self, T_):
+        return value
+
+    return method
+
+
+class Frozen(T(decorators=(mark,), slots=('a', 'b'))):
+    """
+    A template to freeze.
+    """
+    constant = (1, 'two')
+    other = Base
+
+    @templated
+    def method(self, a, T_):
+        return ('frozen', T_.method(self, helper(a)))
+
+    @templated
+    def kwonly(self, *, T_):
+        return T_
+
+    closure = templated(_closure())
+
+    def plain(self):
+        return 'plain'
+
+    @staticmethod
+    def static(a):
+        return a + 1
+
+
+LIMIT = 3
+
+
+class Defaults(T):
+    @templated
+    def method(self, a: Base, n=LIMIT, T_=None) -> tuple:
+        return ('defaults', n)
+
+    def other(self, *, n=LIMIT + 1):
+        return n
+
+
+class _Private(object):
+    def method(self, a):
+        return ('private', a)
+
+
+class Outer(T):
+    @templated
+    def method(self, a, T_):
+        return ('outer', T_.method(self, a))
+
+
+@skipIf(not hasattr(ast, 'unparse'), 'freezing requires Python 3.9')
+class FreezeTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        sys.path.insert(0, self.tmpdir)
+        self.addCleanup(sys.path.remove, self.tmpdir)
+
+    def load(self, name, source):
+        with open(os.path.join(self.tmpdir, name + '.py'), 'w') as f:
+            f.write(source)
+        self.addCleanup(sys.modules.pop, name, None)
+        return import_module(name)
+
+    def test_freeze(self):
+        module = self.load('frozen_basic', freeze([(Frozen, Base)]))
+        cls = module.BaseFrozen
+        built = Frozen(Base)
+
+        self.assertEqual(module.__all__, ['BaseFrozen'])
+        self.assertIsNot(cls, built)
+        self.assertEqual(cls.__bases__, (Base,))
+        self.assertEqual(cls.__doc__, built.__doc__)
+        self.assertEqual(cls.__slots__, ('a', 'b'))
+        self.assertTrue(cls.marked)
+        self.assertEqual(cls.constant, (1, 'two'))
+        self.assertIs(cls.other, Base)
+
+        inst = cls()
+        self.assertEqual(inst.method(1), built().method(1))
+        self.assertIs(inst.kwonly(), Base)
+        self.assertEqual(inst.closure(), 'closure')
+        self.assertEqual(inst.plain(), 'plain')
+        self.assertEqual(cls.static(1), 2)
+
+        # The methods are copies bound to the base, not wrappers.
+        self.assertEqual(cls.method.__kwdefaults__, {'T_': Base})
+        with self.assertRaises(TypeError):
+            inst.method(1, 'oops')
+        self.assertEqual(cls.method.__module__, 'frozen_basic')
+
+    def test_chain(self):
+        source = freeze([(TemplateChain(Outer, Frozen), Base)])
+        module = self.load('frozen_chain', source)
+        self.assertEqual(module.__all__, ['BaseFrozen', 'BaseFrozenOuter'])
+
+        cls = module.BaseFrozenOuter
+        self.assertIs(cls.__base__, module.BaseFrozen)
+        self.assertEqual(
+            cls().method(1),
+            ('outer', ('frozen', ('base', 10))),
+        )
+
+        with self.assertRaises(TypeError):
+            freeze([(TemplateChain(Outer, Frozen, flatten=True), Base)])
+
+    def test_signature_globals(self):
+        """
+        Tests that the globals used by defaults and annotations are bound
+        before the classes that use them.
+        """
+        module = self.load('frozen_defaults', freeze([(Defaults, Base)]))
+        inst = module.BaseDefaults()
+        self.assertEqual(inst.method(None), ('defaults', 3))
+        self.assertEqual(inst.other(), 4)
+        self.assertIs(module.BaseDefaults.method.__annotations__['a'], Base)
+
+    def test_private_base(self):
+        module = self.load('frozen_private', freeze([(Outer, _Private)]))
+        self.assertEqual(
+            module._PrivateOuter().method(1),
+            ('outer', ('private', 1)),
+        )
+
+    def test_main(self):
+        path = os.path.join(self.tmpdir, 'frozen_main.py')
+        self.assertEqual(
+            main([
+                '{0}:Outer,{0}:Base'.format(__name__),
+                '--no-adjust-name',
+                '-o', path,
+            ]),
+            0,
+        )
+        self.addCleanup(sys.modules.pop, 'frozen_main', None)
+        module = import_module('frozen_main')
+        self.assertEqual(module.Outer().method(1), ('outer', ('base', 1)))
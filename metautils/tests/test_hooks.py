@@ -0,0 +1,150 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from unittest import TestCase
+
+from metautils import T, templated, template
+from metautils.hooks import (
+    add_dispatch_hook,
+    add_instantiation_hook,
+    remove_dispatch_hook,
+    remove_instantiation_hook,
+)
+
+
+class Base(object):
+    def method(self, a):
+        return a
+
+
+def first(cls):
+    cls.decorated = ['first']
+    return cls
+
+
+def second(cls):
+    cls.decorated.append('second')
+    return cls
+
+
+class HooksTestCase(TestCase):
+    def test_instantiation(self):
+        def preprocess(name, bases, dict_):
+            return name, bases, dict_
+
+        class M(T(preprocess=preprocess, decorators=(second, first))):
+            pass
+
+        events = []
+        add_instantiation_hook(events.append)
+        self.addCleanup(remove_instantiation_hook, events.append)
+
+        cls = M(Base)
+        self.assertIs(M(Base), cls)
+        self.assertEqual(cls.decorated, ['first', 'second'])
+
+        miss, hit = events
+        self.assertIs(miss.template, M)
+        self.assertIs(miss.base, Base)
+        self.assertTrue(miss.adjust_name)
+        self.assertIs(miss.cls, cls)
+        self.assertFalse(miss.cache_hit)
+        self.assertGreater(miss.preprocess_time, 0)
+        self.assertGreater(miss.build_time, 0)
+        self.assertEqual(
+            [decorator for decorator, _ in miss.decorator_times],
+            [first, second],
+        )
+
+        self.assertIs(hit.cls, cls)
+        self.assertTrue(hit.cache_hit)
+        self.assertEqual(hit.build_time, 0)
+        self.assertEqual(hit.decorator_times, ())
+
+    def test_no_cache(self):
+        class M(T(cachesize=-1)):
+            pass
+
+        events = []
+        add_instantiation_hook(events.append)
+        self.addCleanup(remove_instantiation_hook, events.append)
+
+        M(Base)
+        M(Base)
+        self.assertEqual([event.cache_hit for event in events], [False] * 2)
+
+    def test_remove(self):
+        class M(T):
+            pass
+
+        events = []
+        add_instantiation_hook(events.append)
+        remove_instantiation_hook(events.append)
+        M(Base)
+        self.assertEqual(events, [])
+
+    def test_dispatch(self):
+        class M(T):
+            @templated
+            def method(self, a, T_):
+                return T_.method(self, a) + 1
+
+        before = M(Base, adjust_name=False)
+
+        events = []
+        add_dispatch_hook(events.append)
+        self.addCleanup(remove_dispatch_hook, events.append)
+
+        # Classes built before the hook was added are not observed.
+        self.assertEqual(before().method(1), 2)
+        self.assertEqual(events, [])
+
+        cls = M(Base)
+        self.assertEqual(cls().method(1), 2)
+        self.assertEqual(cls.method.__name__, 'method')
+
+        event, = events
+        self.assertIs(event.template, M)
+        self.assertEqual(event.name, 'method')
+        self.assertIs(event.base, Base)
+        self.assertGreaterEqual(event.time, 0)
+
+    def test_dispatch_removed(self):
+        """
+        Tests that methods built while a dispatch hook was registered do not
+        time their calls once it is removed.
+        """
+        class M(T):
+            @templated
+            def method(self, a, T_):
+                return T_.method(self, a) + 1
+
+        events = []
+        add_dispatch_hook(events.append)
+        cls = M(Base)
+        remove_dispatch_hook(events.append)
+
+        def perf_counter():
+            raise AssertionError('the call was timed')
+
+        self.addCleanup(
+            setattr,
+            template,
+            'perf_counter',
+            template.perf_counter,
+        )
+        template.perf_counter = perf_counter
+
+        self.assertEqual(cls().method(1), 2)
+        self.assertEqual(events, [])
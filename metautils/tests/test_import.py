@@ -0,0 +1,65 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import subprocess
+import sys
+from unittest import TestCase
+
+import metautils
+from metautils.bench import import_time
+
+# The budget for `import metautils` in microseconds. This is generous so that
+# it holds on slow machines and without a bytecode cache; the import takes a
+# few milliseconds.
+IMPORT_BUDGET_US = 25000
+
+
+class ImportTestCase(TestCase):
+    def test_import_time(self):
+        self.assertLess(import_time('metautils', repeat=3), IMPORT_BUDGET_US)
+
+    def test_lazy_submodules(self):
+        """
+        Tests that importing `metautils` does not import the submodules until
+        their names are used.
+        """
+        code = '\n'.join([
+            'import sys',
+            'import metautils',
+            'print(sorted(m for m in sys.modules',
+            '             if m.startswith("metautils")))',
+            'metautils.compose',
+            'print("metautils.nonlocal_" in sys.modules)',
+            'print("metautils.batch" in sys.modules)',
+        ])
+        out = subprocess.check_output(
+            [sys.executable, '-c', code],
+            universal_newlines=True,
+        ).splitlines()
+        self.assertEqual(out, ["['metautils']", 'False', 'False'])
+
+    def test_attributes(self):
+        for name in metautils.__all__:
+            self.assertIs(
+                getattr(metautils, name),
+                getattr(
+                    __import__(metautils._lazy[name], fromlist=[name]),
+                    name,
+                ),
+            )
+
+        with self.assertRaises(AttributeError):
+            metautils.not_an_attribute
+
+        self.assertLessEqual(set(metautils.__all__), set(dir(metautils)))
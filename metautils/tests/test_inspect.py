@@ -0,0 +1,94 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from metautils import T, templated
+from metautils.inspect import format_text, main, snapshot, template_name
+from metautils.template import TemplateChain
+
+
+class Base(object):
+    pass
+
+
+class Inspected(T(cachesize=-1)):
+    @templated
+    def method(self, T_):
+        pass
+
+
+held = Inspected(Base)
+
+
+class InspectTestCase(TestCase):
+    def test_snapshot(self):
+        name = template_name(Inspected)
+        self.assertEqual(name, __name__ + '.Inspected')
+        record, = [r for r in snapshot() if r['template'] == name]
+        self.assertIsNone(record['cache'])
+
+        cls, = record['classes']
+        self.assertEqual(cls['base'], __name__ + '.Base')
+        self.assertTrue(cls['adjust_name'])
+        self.assertEqual(cls['mro_depth'], 3)
+        self.assertGreater(cls['size']['wrappers'], 0)
+        self.assertEqual(
+            cls['size']['total'],
+            sum(v for k, v in cls['size'].items() if k != 'total'),
+        )
+        self.assertEqual(record['size'], cls['size']['total'])
+        self.assertGreater(cls['build_time'], 0)
+
+        self.assertIn(
+            name + '\n  classes: 1, size: ',
+            format_text(snapshot()),
+        )
+
+    def test_chain(self):
+        class M(T):
+            pass
+
+        chain = TemplateChain(M, Inspected, flatten=True)
+        cls = chain(Base)
+        name = template_name(chain)
+        self.assertEqual(
+            name,
+            'TemplateChain({0}, {1}, flatten=True)'.format(
+                template_name(M),
+                template_name(Inspected),
+            ),
+        )
+        record, = [r for r in snapshot() if r['template'] == name]
+        self.assertEqual(record['cache']['misses'], 1)
+        self.assertEqual(record['classes'][0]['mro_depth'], 3)
+        del cls
+
+    def test_main(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'report.json')
+
+        self.assertEqual(main([__name__, '--json', '-o', path]), 0)
+        with open(path) as f:
+            report = json.load(f)
+
+        self.assertIn(
+            template_name(Inspected),
+            [record['template'] for record in report],
+        )
@@ -0,0 +1,79 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from unittest import TestCase
+
+from metautils import T
+from metautils.metrics import (
+    add_exporter,
+    cache_stats,
+    export,
+    remove_exporter,
+)
+from metautils.template import templates
+
+
+class Base(object):
+    pass
+
+
+class MetricsTestCase(TestCase):
+    def test_registry(self):
+        class M(T):
+            pass
+
+        class N(T(cachesize=-1)):
+            pass
+
+        self.assertIn(M, templates())
+        self.assertIn(N, templates())
+
+        stats = dict(cache_stats())
+        self.assertIn(M, stats)
+        self.assertNotIn(N, stats)
+
+    def test_stats(self):
+        class M(T(cachesize=1)):
+            pass
+
+        class B(object):
+            pass
+
+        held = M(Base), M(B), M(Base)
+        info = M.cache_info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 2)
+        self.assertEqual(info.evictions, 2)
+        self.assertEqual(info.size, 2)
+        self.assertEqual(info.maxsize, 1)
+        self.assertGreater(info.build_time, 0)
+
+        M.cache_clear()
+        self.assertEqual(M.cache_info().misses, 0)
+        self.assertIsNot(M(Base), held[0])
+
+    def test_export(self):
+        class M(T):
+            pass
+
+        exported = []
+        add_exporter(exported.append)
+        try:
+            M(Base)
+            stats = export()
+        finally:
+            remove_exporter(exported.append)
+
+        self.assertEqual(exported, [stats])
+        self.assertEqual(dict(stats)[M].misses, 1)
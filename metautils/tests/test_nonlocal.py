@@ -0,0 +1,139 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gc
+import pickle
+import sys
+from unittest import TestCase, skipIf
+from weakref import ref
+
+from metautils.compat import NonLocal
+
+
+class Obj(object):
+    cls_attr = 'cls'
+
+    def __init__(self):
+        self.inst_attr = 'inst'
+
+    def method(self):
+        return 'method'
+
+
+class NonLocalTestCase(TestCase):
+    def test_attributes(self):
+        nl = NonLocal(Obj())
+        self.assertEqual(nl.cls_attr, 'cls')
+        self.assertEqual(nl.inst_attr, 'inst')
+        self.assertEqual(nl.method(), 'method')
+        with self.assertRaises(AttributeError):
+            nl.missing
+
+        nl.inst_attr = 'new'
+        self.assertEqual(nl.inst_attr, 'new')
+        del nl.inst_attr
+        with self.assertRaises(AttributeError):
+            nl.inst_attr
+
+    def test_specialized(self):
+        """
+        Tests that values of the same type share a proxy type with the
+        attributes of that type bound as properties.
+        """
+        self.assertIs(type(NonLocal(1)), type(NonLocal(2)))
+        self.assertIsNot(type(NonLocal(1)), type(NonLocal('a')))
+        self.assertIsInstance(type(NonLocal(1)).__dict__['real'], property)
+        with self.assertRaises(AttributeError):
+            NonLocal(1).__dict__
+
+    def test_proxy_type_collected(self):
+        """
+        Tests that wrapping a value does not keep its type alive.
+        """
+        class C(object):
+            pass
+
+        NonLocal(C())
+        tp = ref(C)
+        del C
+        gc.collect()
+        self.assertIsNone(tp())
+
+    def test_isinstance(self):
+        nl = NonLocal(1)
+        self.assertIsInstance(nl, int)
+        self.assertIsInstance(nl, NonLocal)
+        self.assertIs(nl.__class__, int)
+
+    def test_reassign(self):
+        nl = NonLocal(1)
+        NonLocal.reassign(nl, 'abc')
+        self.assertEqual(nl, 'abc')
+        self.assertEqual(nl.upper(), 'ABC')
+        self.assertIs(type(nl), type(NonLocal('')))
+
+    def test_operators(self):
+        nl = NonLocal(7)
+        self.assertEqual(nl + 1, 8)
+        self.assertEqual(nl * 2, 14)
+        self.assertEqual(round(NonLocal(1.25), 1), 1.2)
+        self.assertEqual(len(NonLocal([1, 2])), 2)
+        self.assertEqual(list(NonLocal([1, 2])), [1, 2])
+
+    def test_reflected(self):
+        nl = NonLocal(7)
+        self.assertEqual(10 - nl, 3)
+        self.assertEqual(2 ** NonLocal(3), 8)
+        self.assertEqual(divmod(7, NonLocal(2)), (3, 1))
+        self.assertEqual([0] + NonLocal([1]), [0, 1])
+
+    def test_inplace(self):
+        """
+        Tests that inplace operators mutate the wrapped value in place when
+        it supports that and keep the proxy.
+        """
+        value = [1]
+        nl = NonLocal(value)
+        proxy = nl
+        nl += [2]
+        self.assertIs(nl, proxy)
+        self.assertIs(nl._NonLocal__nl, value)
+        self.assertEqual(value, [1, 2])
+
+        nl = NonLocal(1)
+        proxy = nl
+        nl += 0.5
+        self.assertIs(nl, proxy)
+        self.assertEqual(nl, 1.5)
+        self.assertFalse(nl.is_integer())
+
+    def test_array(self):
+        class Array(object):
+            def __array__(self, dtype=None):
+                return 'array', dtype
+
+        self.assertEqual(NonLocal(Array()).__array__('f8'), ('array', 'f8'))
+        self.assertFalse(hasattr(type(NonLocal(1)), '__array__'))
+
+    @skipIf(sys.version_info < (3, 12), 'requires the python buffer protocol')
+    def test_buffer(self):
+        value = bytearray(b'abc')
+        view = memoryview(NonLocal(value))
+        view[0] = ord('z')
+        self.assertEqual(value, bytearray(b'zbc'))
+
+    def test_pickle(self):
+        nl = pickle.loads(pickle.dumps(NonLocal([1, 2])))
+        self.assertIsInstance(nl, NonLocal)
+        self.assertEqual(nl, [1, 2])
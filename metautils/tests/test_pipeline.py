@@ -0,0 +1,196 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from itertools import count, islice
+import pickle
+from unittest import TestCase
+
+from metautils import compose
+from metautils.pipeline import (
+    StageCacheInfo,
+    _steps,
+    cached,
+    expanding,
+    filtering,
+    mapping,
+    stream,
+    streaming,
+)
+
+
+def inc(n):
+    return n + 1
+
+
+def double(n):
+    return n * 2
+
+
+def even(n):
+    return n % 2 == 0
+
+
+def pairs(it):
+    it = iter(it)
+    for a in it:
+        yield a, next(it, None)
+
+
+def twice(n):
+    return n, n
+
+
+class StreamTestCase(TestCase):
+    def test_maps(self):
+        pipeline = stream(inc, double)
+        self.assertEqual(list(pipeline([1, 2, 3])), [3, 5, 7])
+        self.assertEqual(pipeline.__name__, 'inc_of_double')
+        self.assertEqual(pipeline.__doc__, 'lambda n: inc(double(n))')
+
+    def test_fuses_maps(self):
+        self.assertEqual(len(_steps((inc, double, inc))), 1)
+        self.assertEqual(len(_steps((inc, pairs, double, inc))), 3)
+
+    def test_empty(self):
+        self.assertEqual(list(stream()([1, 2])), [1, 2])
+
+    def test_kinds(self):
+        pipeline = stream(
+            pairs,
+            expanding(twice),
+            filtering(even),
+            inc,
+        )
+        self.assertEqual(
+            list(pipeline(range(5))),
+            [(2, 2), (4, 4)],
+        )
+        self.assertEqual(pipeline.__name__, 'pairs_of_twice_of_even_of_inc')
+
+    def test_markers(self):
+        pipeline = stream(mapping(pairs), streaming(sorted))
+        self.assertEqual(
+            [list(p) for p in pipeline([[3, 4], [1, 2]])],
+            [[(1, 2)], [(3, 4)]],
+        )
+
+    def test_lazy(self):
+        """
+        Tests that pipelines consume their input lazily, so they work on
+        infinite iterators.
+        """
+        pipeline = stream(pairs, filtering(even), inc)
+        self.assertEqual(
+            list(islice(pipeline(count()), 3)),
+            [(2, 4), (6, 8), (10, 12)],
+        )
+
+    def test_flattens(self):
+        inner = stream(filtering(even), double)
+        pipeline = stream(inc, inner)
+        self.assertEqual(pipeline._streamed, (inc,) + inner._streamed)
+        self.assertEqual(list(pipeline([0, 1, 2])), [1, 3, 5])
+
+
+class CachedTestCase(TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def parse(self, n):
+        self.calls.append(n)
+        return int(n)
+
+    def test_compose(self):
+        stage = cached(self.parse, maxsize=2)
+        f = compose(inc, stage)
+        g = compose(double, stage)
+        self.assertEqual(f('1'), 2)
+        self.assertEqual(g('1'), 2)
+        self.assertEqual(f('2'), 3)
+        self.assertEqual(self.calls, ['1', '2'])
+        self.assertEqual(f.__name__, 'inc_of_parse')
+
+        # Flattening keeps the cached stage.
+        self.assertIs(compose(inc, g).stages[-1], stage)
+
+        f('3')  # Evicts '1'.
+        f('1')
+        self.assertEqual(self.calls, ['1', '2', '3', '1'])
+        self.assertEqual(
+            stage.cache_info(),
+            StageCacheInfo(
+                hits=1,
+                misses=4,
+                evictions=2,
+                size=2,
+                maxsize=2,
+                ttl=None,
+            ),
+        )
+
+        stage.cache_clear()
+        self.assertEqual(stage.cache_info().size, 0)
+        self.assertEqual(stage.cache_info().hits, 0)
+
+    def test_lru(self):
+        stage = cached(self.parse, maxsize=2)
+        stage('1')
+        stage('2')
+        stage('1')  # '2' is now the least recently used.
+        stage('3')
+        stage('1')
+        self.assertEqual(self.calls, ['1', '2', '3'])
+
+    def test_ttl(self):
+        stage = cached(self.parse, maxsize=None, ttl=0)
+        stage('1')
+        stage('1')
+        self.assertEqual(self.calls, ['1', '1'])
+        self.assertEqual(stage.cache_info().evictions, 1)
+
+        stage = cached(self.parse, ttl=60)
+        stage('2')
+        stage('2')
+        self.assertEqual(self.calls, ['1', '1', '2'])
+
+    def test_ttl_unbounded(self):
+        """
+        Tests that expired results are dropped without a maxsize even when
+        they are not requested again.
+        """
+        stage = cached(self.parse, maxsize=None, ttl=0)
+        for n in range(10):
+            stage(str(n))
+
+        info = stage.cache_info()
+        self.assertEqual(info.size, 1)
+        self.assertEqual(info.evictions, 9)
+
+    def test_unhashable(self):
+        stage = cached(len)
+        self.assertEqual(stage([1, 2]), 2)
+        self.assertEqual(stage.cache_info().size, 0)
+
+    def test_stream(self):
+        stage = cached(self.parse)
+        pipeline = stream(inc, stage)
+        self.assertEqual(list(pipeline(['1', '2', '1'])), [2, 3, 2])
+        self.assertEqual(self.calls, ['1', '2'])
+
+    def test_pickle(self):
+        stage = cached(int, maxsize=3, ttl=5)
+        stage('1')
+        loaded = pickle.loads(pickle.dumps(stage))
+        self.assertEqual(loaded.cache_info(), StageCacheInfo(0, 0, 0, 0, 3, 5))
+        self.assertEqual(loaded('2'), 2)
@@ -0,0 +1,90 @@
+#
+# Copyright 2015 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from unittest import TestCase
+
+from metautils import T, templated
+from metautils.resolve import new_class, resolve_metaclass
+from metautils.template import origin
+
+
+class MetaA(type):
+    pass
+
+
+class MetaB(type):
+    pass
+
+
+class SubMetaA(MetaA):
+    pass
+
+
+A = MetaA('A', (object,), {})
+B = MetaB('B', (object,), {})
+SubA = SubMetaA('SubA', (object,), {})
+
+
+def _ordered(tag):
+    class Ordered(T):
+        @templated
+        def __new__(mcls, name, bases, dict_, T_):
+            dict_['order'] = dict_.get('order', ()) + (tag,)
+            return T_.__new__(mcls, name, bases, dict_)
+
+    return Ordered
+
+
+class ResolveTestCase(TestCase):
+    def test_no_conflict(self):
+        self.assertIs(resolve_metaclass(()), type)
+        self.assertIs(resolve_metaclass((object, A)), MetaA)
+        self.assertIs(resolve_metaclass((A, SubA)), SubMetaA)
+        self.assertIs(resolve_metaclass((A,), SubMetaA), SubMetaA)
+
+    def test_conflict(self):
+        meta = resolve_metaclass((A, B))
+        self.assertTrue(issubclass(meta, MetaA))
+        self.assertTrue(issubclass(meta, MetaB))
+        self.assertIs(resolve_metaclass((A, B)), meta)
+
+        # Only the most derived metaclasses are combined.
+        meta = resolve_metaclass((A, SubA, B))
+        self.assertEqual(meta.__bases__, (SubMetaA, MetaB))
+
+    def test_templates(self):
+        """
+        Tests that metaclasses built by templates are combined by applying
+        the templates so that all of their methods run.
+        """
+        M = _ordered('m')
+        N = _ordered('n')
+        metam = M(type)
+        metan = N(type)
+        self.assertEqual(origin(metam), (M, type, True))
+        self.assertIsNone(origin(MetaA))
+
+        meta = resolve_metaclass((metam('C', (), {}), metan('D', (), {})))
+        self.assertTrue(issubclass(meta, metam))
+        self.assertTrue(issubclass(meta, metan))
+        self.assertIn(M(metan), meta.__mro__)
+        self.assertEqual(meta('E', (), {}).order, ('m', 'n'))
+
+    def test_new_class(self):
+        cls = new_class('C', (A, B), {'a': 1})
+        self.assertIsInstance(cls, MetaA)
+        self.assertIsInstance(cls, MetaB)
+        self.assertEqual(cls.a, 1)
+        self.assertEqual(cls.__bases__, (A, B))
+        self.assertIs(type(new_class('D', (A,), metaclass=SubMetaA)), SubMetaA)
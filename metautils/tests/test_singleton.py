@@ -16,9 +16,10 @@ from metautils.compat import PY3
 
 py3_body = r"""\
 
+from threading import Barrier, Thread
 from unittest import TestCase
 
-from metautils.singleton import Singleton
+from metautils.singleton import LazySingleton, Singleton
 from metautils.compat import NonLocal
 
 
@@ -61,6 +62,114 @@ class SingletonTestCase(TestCase):
 
         self.assertEqual(called, 1)
         self.assertIsNot(instance.__new__, new)
+
+
+class LazySingletonTestCase(TestCase):
+    def test_constructed_on_first_use(self):
+        called = NonLocal(0)
+
+        class instance(object, metaclass=LazySingleton()):
+            def __init__(self):
+                NonLocal.reassign(called, called + 1)
+
+            def method(self):
+                return 'm'
+
+        self.assertEqual(called, 0)
+        self.assertEqual(instance.method(), 'm')
+        self.assertEqual(called, 1)
+        self.assertEqual(instance.method(), 'm')
+        self.assertEqual(called, 1)
+
+    def test_kwargs(self):
+        class instance(object, metaclass=LazySingleton(), a='a'):
+            def __init__(self, a):
+                self.a = a
+
+        self.assertEqual(instance.a, 'a')
+
+    def test_recursive_use(self):
+        class config(object, metaclass=LazySingleton()):
+            a = 1
+
+            def __init__(self):
+                self.b = config.a + 1
+
+        with self.assertRaises(RuntimeError):
+            config.b
+
+    def test_attributes(self):
+        class instance(object, metaclass=LazySingleton()):
+            a = 'a'
+
+        self.assertEqual(instance.a, 'a')
+        instance.b = 'b'
+        self.assertEqual(instance.b, 'b')
+        del instance.b
+        self.assertFalse(hasattr(instance, 'b'))
+        self.assertIn('a', dir(instance))
+
+    def test_special_methods(self):
+        class instance(object, metaclass=LazySingleton()):
+            def __call__(self, a):
+                return a + 1
+
+            def __len__(self):
+                return 3
+
+            def __getitem__(self, key):
+                return key * 2
+
+            def __repr__(self):
+                return '<instance>'
+
+        self.assertEqual(instance(1), 2)
+        self.assertEqual(len(instance), 3)
+        self.assertEqual(instance[2], 4)
+        self.assertEqual(repr(instance), '<instance>')
+
+    def test_isinstance(self):
+        class C(object):
+            pass
+
+        class instance(C, metaclass=LazySingleton()):
+            pass
+
+        self.assertIsInstance(instance, C)
+        self.assertEqual(instance.__class__.__name__, 'instance')
+
+    def test_single_instance_of_type(self):
+        class instance(object, metaclass=LazySingleton()):
+            pass
+
+        with self.assertRaises(TypeError):
+            type(instance.__class__())
+
+    def test_threads_construct_once(self):
+        nthreads = 8
+        called = NonLocal(0)
+        barrier = Barrier(nthreads)
+
+        class instance(object, metaclass=LazySingleton()):
+            def __init__(self):
+                NonLocal.reassign(called, called + 1)
+                self.id = object()
+
+        ids = []
+
+        def use():
+            barrier.wait()
+            ids.append(instance.id)
+
+        threads = [Thread(target=use) for _ in range(nthreads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(called, 1)
+        self.assertEqual(len(ids), nthreads)
+        self.assertTrue(all(id_ is ids[0] for id_ in ids))
 """
 
 if PY3:
@@ -12,12 +12,22 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import gc
+import pickle
+from threading import Event, Thread
 from unittest import TestCase
+from weakref import ref
 
-from metautils import T, templated  # noqa
+from metautils import T, compose, templated  # noqa
 from metautils.box import box  # noqa
 from metautils.compat import PY2
-from metautils.template import TemplateBase
+from metautils.template import (
+    LazyInstantiation,
+    TemplateBase,
+    TemplateChain,
+    prefork,
+    prewarm,
+)
 
 
 class MetaFactoryTestCase(TestCase):
@@ -31,6 +41,689 @@ class MetaFactoryTestCase(TestCase):
         self.assertIsInstance(template, TemplateBase)
 
 
+class Base(object):
+    def method(self, a):
+        return 'base', a
+
+
+class TemplatedDispatchTestCase(TestCase):
+    def test_bind_shares_code(self):
+        """
+        Tests that the default dispatch calls the templated function
+        directly instead of through a wrapper.
+        """
+        def f(self, a, T_):
+            return T_.method(self, a)
+
+        class M(T):
+            method = templated(f)
+
+        cls = M(Base)
+
+        code = cls.__dict__['method'].__code__
+        self.assertEqual(code.co_code, f.__code__.co_code)
+        self.assertEqual(code.co_kwonlyargcount, 1)
+        self.assertIs(cls.__dict__['method'].__wrapped__, f)
+        self.assertEqual(cls().method(1), ('base', 1))
+
+    def test_bind_defaults(self):
+        """
+        Tests that `T_` is bound around the other defaults.
+        """
+        class M(T):
+            @templated
+            def method(self, a=1, T_=None, b=2):
+                return T_, a, b
+
+        cls = M(Base)
+        self.assertEqual(cls().method(), (Base, 1, 2))
+        self.assertEqual(cls().method(3, b=4), (Base, 3, 4))
+
+    def test_bind_extra_positional(self):
+        """
+        Tests that an extra positional argument cannot replace `T_`.
+        """
+        for dispatch in 'bind', 'wrap':
+            class M(T(dispatch=dispatch)):
+                @templated
+                def method(self, a, T_):
+                    return T_
+
+                @templated
+                def default(self, a, T_=None):
+                    return T_
+
+            inst = M(Base)()
+            self.assertIs(inst.method(1), Base)
+            self.assertIs(inst.default(1), Base)
+            with self.assertRaises(TypeError):
+                inst.method(1, 'oops')
+            with self.assertRaises(TypeError):
+                inst.default(1, 'oops')
+
+    def test_fallback_wrap(self):
+        """
+        Tests that methods where `T_` cannot be defaulted are wrapped.
+        """
+        class M(T):
+            @templated
+            def method(self, T_, a):
+                return T_.method(self, a)
+
+        cls = M(Base)
+        self.assertEqual(cls().method(a=1), ('base', 1))
+        self.assertIsNot(
+            cls.__dict__['method'].__code__,
+            cls.__dict__['method'].__wrapped__.__code__,
+        )
+
+    def test_wrap(self):
+        """
+        Tests the 'wrap' dispatch.
+        """
+        class M(T(dispatch='wrap')):
+            @templated
+            def method(self, a, T_):
+                return T_.method(self, a)
+
+        cls = M(Base)
+        self.assertEqual(cls().method(1), ('base', 1))
+        self.assertIsNot(
+            cls.__dict__['method'].__code__,
+            cls.__dict__['method'].__wrapped__.__code__,
+        )
+
+    def test_invalid_dispatch(self):
+        with self.assertRaises(ValueError):
+            class M(T(dispatch='invalid')):
+                pass
+
+
+class TemplateCacheTestCase(TestCase):
+    def test_identity(self):
+        """
+        Tests that equivalent calls return the same class.
+        """
+        class M(T):
+            pass
+
+        cls = M(Base)
+        self.assertIs(M(Base), cls)
+        self.assertIs(M(base=Base), cls)
+        self.assertIs(M(Base, 1), cls)
+        self.assertIs(M(Base, adjust_name=True), cls)
+        self.assertIsNot(M(Base, adjust_name=False), cls)
+
+    def test_weak(self):
+        """
+        Tests that the cache does not keep the bases or the classes alive.
+        """
+        class M(T):
+            pass
+
+        class B(object):
+            pass
+
+        cls = ref(M(B))
+        base = ref(B)
+        del B
+        gc.collect()
+        self.assertIsNone(cls())
+        self.assertIsNone(base())
+
+    def test_bounded_identity(self):
+        """
+        Tests that classes evicted from a bounded cache are still returned
+        while they are alive.
+        """
+        class M(T(cachesize=1)):
+            pass
+
+        class B(object):
+            pass
+
+        cls = M(B)
+        M(Base)  # Evict the strong reference to `cls`.
+        self.assertIs(M(B), cls)
+
+    def test_bounded_holds(self):
+        """
+        Tests that a bounded cache keeps the most recent classes alive.
+        """
+        class M(T(cachesize=1)):
+            pass
+
+        class B(object):
+            pass
+
+        cls = ref(M(B))
+        gc.collect()
+        self.assertIsNotNone(cls())
+
+    def test_no_cache(self):
+        class M(T(cachesize=-1)):
+            pass
+
+        self.assertIsNot(M(Base), M(Base))
+
+
+class TemplateThreadingTestCase(TestCase):
+    def test_single_flight(self):
+        """
+        Tests that concurrent misses on the same base build one class.
+        """
+        building = Event()
+        release = Event()
+        calls = []
+
+        def preprocess(name, bases, dict_):
+            calls.append(name)
+            building.set()
+            release.wait()
+            return name, bases, dict_
+
+        class M(T(preprocess=preprocess)):
+            pass
+
+        results = []
+
+        def instantiate():
+            results.append(M(Base))
+
+        threads = [Thread(target=instantiate) for _ in range(8)]
+        threads[0].start()
+        building.wait()
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(cls is results[0] for cls in results))
+
+    def test_failed_build(self):
+        """
+        Tests that a failed build is not cached.
+        """
+        fail = [True]
+
+        def preprocess(name, bases, dict_):
+            if fail[0]:
+                raise ValueError('failed')
+            return name, bases, dict_
+
+        class M(T(preprocess=preprocess)):
+            pass
+
+        with self.assertRaises(ValueError):
+            M(Base)
+
+        fail[0] = False
+        self.assertIsInstance(M(Base), type)
+
+    def test_recursive(self):
+        """
+        Tests that instantiating a template with the same arguments while it
+        is being built raises instead of deadlocking.
+        """
+        def preprocess(name, bases, dict_):
+            M(Base)
+            return name, bases, dict_
+
+        class M(T(preprocess=preprocess)):
+            pass
+
+        with self.assertRaises(RuntimeError):
+            M(Base)
+
+
+class SlotsTestCase(TestCase):
+    def test_slots(self):
+        class M(T(slots=('a', 'b'))):
+            pass
+
+        class SlotBase(object):
+            __slots__ = 'a',
+
+        cls = M(SlotBase)
+        self.assertEqual(cls.__slots__, ('b',))
+        inst = cls()
+        inst.a = inst.b = 1
+        self.assertFalse(hasattr(inst, '__dict__'))
+
+        self.assertEqual(M(object).__slots__, ('a', 'b'))
+
+    def test_conflicts(self):
+        with self.assertRaises(TypeError):
+            class M(T(slots=('a',))):
+                a = 1
+
+        with self.assertRaises(TypeError):
+            class N(T(slots=('a',))):
+                __slots__ = 'a',
+
+    def test_flattened(self):
+        class M(T(slots=('a', 'b'))):
+            pass
+
+        class N(T(slots=('b', 'c'))):
+            pass
+
+        cls = TemplateChain(M, N, flatten=True)(object)
+        self.assertEqual(cls.__slots__, ('b', 'c', 'a'))
+
+
+class InstantiateTestCase(TestCase):
+    def test_instantiate(self):
+        class M(T):
+            pass
+
+        class B(object):
+            pass
+
+        cls = ref(M.instantiate(B, adjust_name=False)[0])
+        del B
+        gc.collect()
+        # The class is pinned in the cache.
+        self.assertIsNotNone(cls())
+        self.assertEqual(M.cache_info().size, 1)
+        self.assertIs(M(cls().__base__, adjust_name=False), cls())
+        self.assertEqual(M.cache_info().hits, 1)
+
+        M.cache_clear()
+        gc.collect()
+        self.assertIsNone(cls())
+
+    def test_instantiate_many(self):
+        class M(T):
+            pass
+
+        class N(T):
+            pass
+
+        class B(object):
+            pass
+
+        self.assertEqual(M.instantiate(Base, B), [M(Base), M(B)])
+        chain = TemplateChain(M, N)
+        self.assertEqual(chain.instantiate(Base), [M(N(Base))])
+
+        with self.assertRaises(TypeError):
+            M.instantiate(Base, adjustname=False)
+
+    def test_prewarm(self):
+        class M(T):
+            pass
+
+        class N(T(cachesize=-1)):
+            pass
+
+        class Other(Base):
+            pass
+
+        # Each cache is pinned once for the whole batch.
+        pinned = []
+        pin = M._cache.pin
+
+        def record_pin(entries):
+            pinned.append(list(entries))
+            pin(pinned[-1])
+
+        M._cache.pin = record_pin
+
+        classes = prewarm([(M, Base), (N, Base), (M, Base), (M, Other)])
+        self.assertEqual(classes[0].__bases__, (Base,))
+        self.assertIs(classes[2], classes[0])
+        self.assertIs(classes[0], M(Base))
+        self.assertEqual(classes[1].__name__, 'BaseN')
+        self.assertIs(classes[3], M(Other))
+        self.assertEqual(len(pinned), 1)
+        self.assertEqual(len(pinned[0]), 3)
+
+    def test_prefork(self):
+        prefork()
+        if hasattr(gc, 'freeze'):
+            self.addCleanup(gc.unfreeze)
+            self.assertGreater(gc.get_freeze_count(), 0)
+
+
+class TemplateChainTestCase(TestCase):
+    def test_chain(self):
+        """
+        Tests that a chain applies its templates from right to left.
+        """
+        class M(T):
+            pass
+
+        class N(T):
+            pass
+
+        chain = TemplateChain(M, N)
+        cls = chain(Base)
+        self.assertIs(cls, M(N(Base)))
+        self.assertEqual(cls.__name__, 'BaseNM')
+        self.assertIs(chain(Base), cls)
+        self.assertIs(chain(base=Base, adjust_name=1), cls)
+        self.assertEqual(chain.cache_info().hits, 2)
+        self.assertEqual(chain.cache_info().misses, 1)
+
+    def test_compose(self):
+        """
+        Tests that composing templates returns a flattened chain.
+        """
+        class M(T):
+            pass
+
+        class N(T):
+            pass
+
+        class P(T):
+            pass
+
+        chain = compose(compose(M, N), P)
+        self.assertIsInstance(chain, TemplateChain)
+        self.assertIsInstance(chain, TemplateBase)
+        self.assertEqual(chain.templates, (M, N, P))
+        self.assertIs(chain(Base), M(N(P(Base))))
+
+    def test_not_template(self):
+        class M(T):
+            pass
+
+        with self.assertRaises(TypeError):
+            TemplateChain(M, type)
+
+        with self.assertRaises(TypeError):
+            TemplateChain(M, cachesiz=1)
+
+
+class FlattenedTemplateChainTestCase(TestCase):
+    def test_methods_chain(self):
+        """
+        Tests that a flattened chain has the same behavior as the nested
+        classes with a shallow MRO.
+        """
+        class M(T):
+            a = 'm'
+
+            @templated
+            def method(self, a, T_):
+                return ('m', T_.method(self, a))
+
+        class N(T):
+            b = 'n'
+
+            @templated
+            def method(self, a, T_):
+                return ('n', T_.method(self, a))
+
+        class P(T):
+            @templated
+            def method(self, a, T_):
+                return ('p', T_.method(self, a))
+
+        chain = TemplateChain(M, N, P, flatten=True)
+        cls = chain(Base)
+        nested = M(N(P(Base)))
+
+        self.assertEqual(cls.__mro__, (cls,) + Base.__mro__)
+        self.assertEqual(cls.__name__, nested.__name__)
+        self.assertEqual(cls().method(1), nested().method(1))
+        self.assertEqual(cls.a, 'm')
+        self.assertEqual(cls.b, 'n')
+        self.assertIs(chain(Base), cls)
+        flat = TemplateChain(M, N, flatten=True)
+        self.assertEqual(flat(Base, adjust_name=False).__name__, 'M')
+
+    def test_fallback_to_base(self):
+        class M(T):
+            @templated
+            def method(self, a, T_):
+                return ('m', T_.method(self, a))
+
+        class N(T):
+            @templated
+            def other(self, T_):
+                return 'n'
+
+        cls = TemplateChain(M, N, flatten=True)(Base)
+        self.assertEqual(cls().method(1), ('m', ('base', 1)))
+
+    def test_metaclass(self):
+        class M(T):
+            @templated
+            def __new__(mcls, name, bases, dict_, T_):
+                dict_['order'] = dict_.get('order', ()) + ('m',)
+                return T_.__new__(mcls, name, bases, dict_)
+
+        class N(T):
+            @templated
+            def __new__(mcls, name, bases, dict_, T_):
+                dict_['order'] = dict_.get('order', ()) + ('n',)
+                return T_.__new__(mcls, name, bases, dict_)
+
+        meta = TemplateChain(M, N, flatten=True)(type)
+        self.assertEqual(len(meta.__mro__), len(type.__mro__) + 1)
+        cls = meta('C', (object,), {})
+        self.assertEqual(cls.order, ('m', 'n'))
+
+    def test_slots_and_decorators(self):
+        def m_dec(cls):
+            cls.decorated = cls.decorated + ('m',)
+            return cls
+
+        def n_dec(cls):
+            cls.decorated = ('n',)
+            return cls
+
+        class M(T(decorators=(m_dec,))):
+            __slots__ = 'a',
+
+        class N(T(decorators=(n_dec,))):
+            __slots__ = 'b',
+
+        cls = TemplateChain(M, N, flatten=True)(object)
+        self.assertEqual(cls.__slots__, ('b', 'a'))
+        self.assertEqual(cls.decorated, ('n', 'm'))
+
+    def test_preprocess(self):
+        class M(T(preprocess=lambda *args: args)):
+            pass
+
+        class N(T):
+            pass
+
+        with self.assertRaises(TypeError):
+            TemplateChain(M, N, flatten=True)
+
+    def test_untemplated_override(self):
+        """
+        Tests that an outer template cannot hide an inner template's member
+        without `templated`, since it could not reach the inner member.
+        """
+        class M(T):
+            def method(self, a):
+                return 'm'
+
+        class N(T):
+            @templated
+            def method(self, a, T_):
+                return ('n', T_.method(self, a))
+
+        with self.assertRaises(TypeError):
+            TemplateChain(M, N, flatten=True)
+
+        # Overriding the base is fine.
+        self.assertEqual(
+            TemplateChain(M, flatten=True)(Base)().method(1),
+            'm',
+        )
+
+    def test_pickle(self):
+        chain = TemplateChain(
+            PickleTemplate,
+            OtherPickleTemplate,
+            flatten=True,
+        )
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            loaded = pickle.loads(pickle.dumps(chain, protocol))
+            self.assertTrue(loaded.flatten)
+            self.assertEqual(loaded.templates, chain.templates)
+
+
+class PickleTemplate(T):
+    @templated
+    def method(self, T_):
+        return 'pickled'
+
+
+class OtherPickleTemplate(T):
+    pass
+
+
+class Nested(object):
+    class Base(object):
+        pass
+
+
+class PickleTestCase(TestCase):
+    def assert_roundtrips(self, obj):
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertIs(pickle.loads(pickle.dumps(obj, protocol)), obj)
+
+    def test_class(self):
+        self.assert_roundtrips(PickleTemplate(Base))
+        self.assert_roundtrips(PickleTemplate(Base, adjust_name=False))
+        self.assert_roundtrips(PickleTemplate(Nested.Base))
+        self.assert_roundtrips(
+            PickleTemplate(OtherPickleTemplate(OtherPickleTemplate(type))),
+        )
+
+    def test_rebuild(self):
+        """
+        Tests that unpickling a class that is no longer cached rebuilds it
+        through the template.
+        """
+        data = pickle.dumps(PickleTemplate(OtherPickleTemplate(Base)))
+        PickleTemplate.cache_clear()
+        OtherPickleTemplate.cache_clear()
+
+        cls = pickle.loads(data)
+        self.assertIs(cls, PickleTemplate(OtherPickleTemplate(Base)))
+        self.assertEqual(
+            cls.__name__,
+            'BaseOtherPickleTemplatePickleTemplate',
+        )
+
+    def test_instance(self):
+        inst = pickle.loads(pickle.dumps(PickleTemplate(Base)()))
+        self.assertIsInstance(inst, PickleTemplate(Base))
+        self.assertEqual(inst.method(), 'pickled')
+
+    def test_template(self):
+        self.assert_roundtrips(PickleTemplate)
+        chain = pickle.loads(
+            pickle.dumps(TemplateChain(PickleTemplate, OtherPickleTemplate)),
+        )
+        self.assertEqual(
+            chain.templates,
+            (PickleTemplate, OtherPickleTemplate),
+        )
+
+    def test_getattr(self):
+        with self.assertRaises(AttributeError):
+            PickleTemplate.not_an_instance
+
+        # Names that look like instances but do not resolve to a class.
+        self.assertFalse(hasattr(PickleTemplate, 'x[nosuchmodule:y]'))
+        self.assertFalse(hasattr(PickleTemplate, 'x[os:nosuchattr]'))
+        self.assertFalse(hasattr(PickleTemplate, 'x[os:getcwd]'))
+
+
+class LazyTestCase(TestCase):
+    def setUp(self):
+        self.built = built = []
+
+        def preprocess(name, bases, dict_):
+            built.append(bases[0])
+            return name, bases, dict_
+
+        class M(T(preprocess=preprocess)):
+            """
+            A template to instantiate lazily.
+            """
+            a = 'a'
+
+            @templated
+            def method(self, T_):
+                return T_.method(self, 'm')
+
+        self.M = M
+
+    def test_deferred(self):
+        lazy = self.M.lazy(Base)
+        self.assertIsInstance(lazy, LazyInstantiation)
+        self.assertEqual(self.built, [])
+        self.assertIn('lazy', repr(lazy).lower())
+
+        self.assertEqual(lazy.a, 'a')
+        self.assertEqual(self.built, [Base])
+        self.assertEqual(repr(lazy), repr(self.M(Base)))
+
+    def test_class_attributes(self):
+        lazy = self.M.lazy(Base)
+        cls = self.M(Base)
+        self.assertEqual(lazy.__doc__, cls.__doc__)
+        self.assertEqual(lazy.__module__, cls.__module__)
+        self.assertNotEqual(lazy.__module__, LazyInstantiation.__module__)
+
+    def test_eq_hash(self):
+        lazy = self.M.lazy(Base)
+        cls = self.M(Base)
+        self.assertTrue(lazy == cls)
+        self.assertTrue(cls == lazy)
+        self.assertFalse(lazy != cls)
+        self.assertEqual(hash(lazy), hash(cls))
+        self.assertIn(lazy, {cls: 1})
+        self.assertEqual(lazy, self.M.lazy(Base))
+        self.assertNotEqual(lazy, Base)
+
+    def test_call(self):
+        inst = self.M.lazy(Base)()
+        self.assertIsInstance(inst, self.M(Base))
+        self.assertEqual(inst.method(), ('base', 'm'))
+
+    def test_isinstance(self):
+        lazy = self.M.lazy(Base)
+        self.assertFalse(isinstance(Base(), lazy))
+        self.assertEqual(self.built, [Base])
+        self.assertTrue(isinstance(self.M(Base)(), lazy))
+        self.assertTrue(issubclass(self.M(Base), lazy))
+
+    def test_subclass(self):
+        lazy = self.M.lazy(Base)
+
+        class C(lazy):
+            pass
+
+        self.assertIs(C.__base__, self.M(Base))
+
+    def test_metaclass(self):
+        lazy = self.M.lazy(TestMeta)
+        cls = lazy('C', (object,), {})
+        self.assertIsInstance(cls, self.M(TestMeta))
+
+    def test_chain(self):
+        class N(T):
+            pass
+
+        lazy = compose(N, self.M).lazy(Base)
+        self.assertEqual(self.built, [])
+        self.assertTrue(issubclass(N(self.M(Base)), lazy))
+
+
 class TestMeta(type):
     """
     A metaclass for testing.
@@ -243,6 +936,86 @@ class TemplateTestCase(TestCase):
         self.assertIs(D.__base__, TestMeta)
         self.assertIs(D.__bases__[1], tsfmmarker)
 
+    def test_bind_kwonly_extra_positional(self):
+        """
+        Tests that an extra positional argument cannot replace a keyword
+        only `T_`.
+        """
+        class M(T):
+            @templated
+            def method(self, a, *, T_):
+                return T_
+
+        cls = M(Base)
+        self.assertIs(cls().method(1), Base)
+        with self.assertRaises(TypeError):
+            cls().method(1, 2)
+
+    def test_flatten_super(self):
+        """
+        Tests that templates that use zero argument `super` cannot be
+        flattened, since `super` would skip the inner templates.
+        """
+        class Outer(T):
+            def greet(self):
+                return ['outer'] + super().greet()
+
+        class Inner(T):
+            @templated
+            def greet(self, T_):
+                return ['inner'] + T_.greet(self)
+
+        class Greeter(object):
+            def greet(self):
+                return ['base']
+
+        self.assertEqual(
+            TemplateChain(Outer, Inner)(Greeter)().greet(),
+            ['outer', 'inner', 'base'],
+        )
+        with self.assertRaises(TypeError):
+            TemplateChain(Outer, Inner, flatten=True)
+
+    def test_slots_from_annotations(self):
+        from typing import ClassVar
+
+        class Point(T, slots=True):
+            x: int
+            y: int
+            count: ClassVar[int]
+
+        cls = Point(object)
+        self.assertEqual(cls.__slots__, ('x', 'y'))
+        inst = cls()
+        inst.x = 1
+        self.assertFalse(hasattr(inst, '__dict__'))
+
+        with self.assertRaises(TypeError):
+            class Bad(T, slots=True):
+                x: int = 0
+
+    def test_slots_classvar_spellings(self):
+        import typing
+        import typing as t
+
+        class Point(T, slots=True):
+            x: int
+            a: t.ClassVar[int]
+            b: typing.ClassVar
+            c: 'typing.ClassVar[int]'
+            d: 'ClassVar'
+
+        self.assertEqual(Point(object).__slots__, ('x',))
+
+    def test_slots_no_annotations(self):
+        with self.assertRaises(TypeError):
+            class Empty(T, slots=True):
+                pass
+
+        with self.assertRaises(TypeError):
+            class OnlyClassVars(T, slots=True):
+                count: 'ClassVar[int]'
+
 '''
 
 exec(py2_body if PY2 else py3_body)